@@ -0,0 +1,67 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+import numpy as np
+import pandas as pd
+
+# Pro-rata allocation engine shared by capital calls, P&L and distributions.
+# Everything is done in integer cents so each batch sums exactly to its total.
+
+# Above this magnitude weight * total could overflow int64, so fall back to
+# Python ints (object arrays) for the exact products.
+_INT64_SAFE = 2 ** 62
+
+
+def to_cents(amount):
+    return int((Decimal(str(amount)) * 100).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+
+
+def cents_array(values):
+    return np.rint(np.asarray(values, dtype=float) * 100).astype(np.int64)
+
+
+def allocate_cents(total_cents, weights):
+    # Largest-remainder split of total_cents over integer weights.
+    weights = np.asarray(weights, dtype=np.int64)
+    if weights.size == 0:
+        return weights
+    if (weights < 0).any():
+        raise ValueError("Allocation weights must be non-negative.")
+    denom = int(weights.sum())
+    if denom == 0:
+        raise ValueError("Cannot allocate over zero total commitment.")
+
+    total_cents = int(total_cents)
+    sign = -1 if total_cents < 0 else 1
+    total = abs(total_cents)
+
+    if total * int(weights.max()) >= _INT64_SAFE:
+        weights = weights.astype(object)
+    num = weights * total
+    shares = num // denom
+    remainders = num - shares * denom
+
+    shortfall = total - int(shares.sum())
+    if shortfall:
+        # Stable sort keeps ties in commitment order, so re-running a split is deterministic.
+        order = np.argsort(-remainders.astype(float), kind="stable")[:shortfall]
+        shares[order] += 1
+    return (shares.astype(np.int64)) * sign
+
+
+def pro_rata(commitments, amount):
+    # commitments: DataFrame with 'committed_amount'. Returns a copy with
+    # 'share_cents' (int64) and 'Share' (dollars, for display).
+    df = commitments.copy()
+    weights = cents_array(df["committed_amount"])
+    df["share_cents"] = allocate_cents(to_cents(amount), weights)
+    df["Share"] = df["share_cents"] / 100
+    return df
+
+
+def build_entries(batch_id, commitment_ids, trans_code, share_cents):
+    ids = pd.Series(commitment_ids).tolist()
+    amounts = (np.asarray(share_cents, dtype=np.int64) / 100).tolist()
+    return [
+        {"batch_id": batch_id, "commitment_id": cid, "trans_code": trans_code, "amount": amt}
+        for cid, amt in zip(ids, amounts)
+    ]
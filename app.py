@@ -1,9 +1,19 @@
+import functools
+import os
+from contextlib import nullcontext
 import streamlit as st
 import pandas as pd
-from datetime import date
-from supabase import create_client
-from fpdf import FPDF
-import tempfile
+from allocation import pro_rata, build_entries
+import data
+import fetch
+import instrument
+import pcap
+import snapshots
+import statements
+import storage
+import writer
+from fpdf.errors import FPDFUnicodeEncodingException
+from statements import fmt, create_pdf
 
 # --- 1. SETUP DATABASE CONNECTION ---
 # ⚠️ REPLACE WITH YOUR ACTUAL KEYS
@@ -12,91 +22,91 @@ SUPABASE_KEY = "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9.eyJpc3MiOiJzdXBhYmFzZSIsInJ
 
 @st.cache_resource
 def init_connection():
+    # Falls back to the local SQLite database if the hosted client can't be created.
     try:
-        return create_client(SUPABASE_URL, SUPABASE_KEY)
+        return storage.connect(SUPABASE_URL, SUPABASE_KEY)
     except Exception as e:
         return None
 
-supabase = init_connection()
+repo = init_connection()
 
 # --- 2. CONFIG & HELPER FUNCTIONS ---
 st.set_page_config(page_title="FundLite | Pro", page_icon="🏦", layout="wide")
 
-def fmt(val):
-    return f"${val:,.2f}"
-
-def create_pdf(investor_name, fund_name, balance, unfunded, transactions):
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Arial", size=12)
-    
-    # Header
-    pdf.set_font("Arial", "B", 16)
-    pdf.cell(190, 10, txt=fund_name, ln=True, align='C')
-    pdf.set_font("Arial", "I", 10)
-    pdf.cell(190, 10, txt="Partner Capital Account Statement", ln=True, align='C')
-    pdf.line(10, 30, 200, 30)
-    
-    # Info
-    pdf.ln(10)
-    pdf.set_font("Arial", "B", 12)
-    pdf.cell(0, 10, txt=f"Investor: {investor_name}", ln=True)
-    pdf.cell(0, 10, txt=f"Date: {date.today()}", ln=True)
-    
-    # Summary Box
-    pdf.ln(5)
-    pdf.set_fill_color(240, 240, 240)
-    pdf.cell(0, 10, txt=f"Ending Capital Balance: {fmt(balance)}", ln=True, fill=True)
-    pdf.cell(0, 10, txt=f"Remaining Unfunded Commitment: {fmt(unfunded)}", ln=True, fill=True)
-    
-    # Table Header
-    pdf.ln(10)
-    pdf.set_font("Arial", "B", 10)
-    pdf.cell(30, 10, "Date", 1)
-    pdf.cell(40, 10, "Type", 1)
-    pdf.cell(80, 10, "Description", 1)
-    pdf.cell(40, 10, "Amount", 1, ln=True, align='R')
-    
-    # Table Rows
-    pdf.set_font("Arial", "", 10)
-    for index, row in transactions.iterrows():
-        d_str = str(row['date'])
-        t_type = str(row['trans_code'])
-        # Simple Logic to clean up Description
-        if "Call" in str(row['trans_code']): desc = "Capital Call"
-        elif "DIST" in str(row['trans_code']): desc = "Distribution"
-        else: desc = "P&L Allocation"
-        
-        amt = fmt(float(row['amount']))
-        
-        pdf.cell(30, 10, d_str, 1)
-        pdf.cell(40, 10, t_type, 1)
-        pdf.cell(80, 10, desc, 1)
-        pdf.cell(40, 10, amt, 1, ln=True, align='R')
-        
-    return pdf.output(dest='S').encode('latin-1')
-
 # --- 3. SIDEBAR ---
 with st.sidebar:
     st.title("FundLite Admin")
-    if supabase:
+    if repo and repo.name == "supabase":
         st.success("🟢 System Online")
+    elif repo:
+        st.warning("🟡 Local database (SQLite)")
     else:
         st.error("🔴 DB Connection Failed")
     st.markdown("---")
-    st.write("**Fund:** Harbor View Fund I")
+    funds = data.get_funds(repo) if repo else []
+    if funds:
+        fund_names = {f['name']: f['id'] for f in funds}
+        fund_name = st.selectbox("**Fund**", list(fund_names.keys()), key="fund_name")
+        fund_id = fund_names[fund_name]
+    else:
+        fund_name, fund_id = None, None
+        st.write("**Fund:** none set up")
+    # Drafts and generated statements belong to the fund they were built for.
+    if st.session_state.get('active_fund_id') != fund_id:
+        for k in ('last_cc_draft', 'last_pl_draft', 'last_dist_draft', 'bulk_statements', 'bulk_failed'):
+            st.session_state.pop(k, None)
+        st.session_state['active_fund_id'] = fund_id
+    show_perf = st.toggle("⏱️ Performance panel", value=False)
+
+# Instrumentation is only wired in when the panel is on or FUNDLITE_METRICS
+# names a JSON-lines file, so a normal rerun pays nothing for it.
+METRICS_PATH = os.environ.get('FUNDLITE_METRICS')
+recorder = None
+if repo and (show_perf or METRICS_PATH):
+    recorder = instrument.Recorder(sink=METRICS_PATH)
+    repo = instrument.InstrumentedRepository(repo, recorder)
 
-# --- 4. MAIN TABS ---
-# UPDATED: Added Tab 5 for Distributions
-tab1, tab2, tab4, tab5, tab3 = st.tabs(["📊 Fund Overview", "📢 Capital Calls", "📈 P&L Allocation", "💸 Distributions", "📄 Live PCAP Statement"])
+def perf(name):
+    return repo.recorder.phase(name) if recorder else nullcontext()
 
-# === TAB 1: OVERVIEW ===
-with tab1:
+# True while the whole script runs; a fragment-only rerun runs just the
+# fragment function, after this run has finished and reset the flag.
+full_run = True
+
+def fragment(fn):
+    # st.fragment with per-rerun instrumentation. A fragment-only rerun gets
+    # its own Recorder (new run_id) instead of appending to the last full
+    # run's, and draws its panel under the fragment: fragments can't write
+    # to the sidebar.
+    @functools.wraps(fn)
+    def run():
+        if recorder is None or full_run:
+            return fn()
+        repo.recorder = instrument.Recorder(sink=METRICS_PATH, scope='fragment')
+        with perf(f"fragment.{fn.__name__}"):
+            fn()
+        if show_perf:
+            with st.expander("⏱️ This fragment rerun"):
+                instrument.render_panel(repo.recorder)
+    return st.fragment(run)
+
+def prefetch_drafts(kind):
+    # Warm the cache for a draft/review screen: its draft list and the
+    # commitments behind the split preview load concurrently.
+    if repo and fund_id:
+        fetch.gather(lambda: data.get_draft_batches(repo, fund_id, kind), lambda: data.get_commitments(repo, fund_id))
+
+# --- 4. VIEWS ---
+# Each screen is a function run only when selected (see NAVIGATION below).
+# Draft and review panes are fragments, so their widgets rerun only that pane.
+
+# === OVERVIEW ===
+def view_overview():
     st.header("Fund Overview")
-    if supabase:
-        comm_data = supabase.table('commitments').select("*, investors(display_name)").execute()
-        if comm_data.data:
-            df = pd.DataFrame(comm_data.data)
+    if repo and fund_id:
+        comm_data, fund_totals = fetch.gather(lambda: data.get_commitments(repo, fund_id), lambda: data.get_fund_totals(repo, fund_id))
+        if comm_data:
+            df = pd.DataFrame(comm_data)
             df['Investor Name'] = df['investors'].apply(lambda x: x['display_name'] if x else "Unknown")
             df['Commitment'] = df['committed_amount']
             
@@ -112,333 +122,406 @@ with tab1:
             
             display_df = df[['Investor Name', 'Commitment', 'Ownership %']].copy()
             display_df.index = display_df.index + 1
-            st.table(display_df.style.format({'Commitment': '${:,.2f}', 'Ownership %': '{:.2f}%'}))
+            with perf("overview.table"):
+                st.table(display_df.style.format({'Commitment': '${:,.2f}', 'Ownership %': '{:.2f}%'}))
+            
+            st.divider()
+            st.subheader("Capital Accounts (All Investors)")
+            with perf("overview.fund_report"):
+                report = pcap.fund_report(comm_data, fund_totals)
+                money = st.column_config.NumberColumn(format="$%.2f")
+                st.dataframe(report, hide_index=True, use_container_width=True,
+                             column_config={c: money for c in pcap.REPORT_COLUMNS[1:]})
+            st.download_button("📥 Download CSV", report.to_csv(index=False), "capital_accounts.csv", "text/csv")
         else:
             st.warning("No investors found.")
 
-# === TAB 2: CAPITAL CALL ===
-with tab2:
+
+# === CAPITAL CALL ===
+def view_capital_calls():
     st.header("Capital Call Management")
+    prefetch_drafts('call')
     call_tab1, call_tab2 = st.tabs(["1️⃣ Create Draft", "2️⃣ Review & Post"])
-    
     with call_tab1:
-        st.subheader("Step 1: Draft New Call")
-        c1, c2 = st.columns(2)
-        with c1:
-            draft_amount = st.number_input("Total Call Amount ($)", value=100000.00, step=10000.00)
-        with c2:
-            draft_date = st.date_input("Due Date")
-            
-        if supabase:
-            if st.button("Calculate Split"):
-                comm_resp = supabase.table('commitments').select("*, investors(display_name)").execute()
-                if comm_resp.data:
-                    df_draft = pd.DataFrame(comm_resp.data)
-                    df_draft['Investor'] = df_draft['investors'].apply(lambda x: x['display_name'])
-                    total_comm = df_draft['committed_amount'].sum()
-                    df_draft['Share'] = (df_draft['committed_amount'] / total_comm) * draft_amount
-                    
-                    st.markdown("### Preview")
-                    preview_df = df_draft[['Investor', 'Share']].copy()
-                    preview_df.index = preview_df.index + 1
+        capital_call_draft()
+    with call_tab2:
+        capital_call_review()
+
+
+@fragment
+def capital_call_draft():
+    st.subheader("Step 1: Draft New Call")
+    c1, c2 = st.columns(2)
+    with c1:
+        draft_amount = st.number_input("Total Call Amount ($)", value=100000.00, step=10000.00)
+    with c2:
+        draft_date = st.date_input("Due Date")
+        
+    if repo and fund_id:
+        if st.button("Calculate Split"):
+            comm_resp = data.get_commitments(repo, fund_id)
+            if comm_resp:
+                df_draft = pd.DataFrame(comm_resp)
+                df_draft['Investor'] = df_draft['investors'].apply(lambda x: x['display_name'])
+                df_draft = pro_rata(df_draft, draft_amount)
+                
+                st.markdown("### Preview")
+                preview_df = df_draft[['Investor', 'Share']].copy()
+                preview_df.index = preview_df.index + 1
+                with perf("draft.preview_table"):
                     st.table(preview_df.style.format({'Share': '${:,.2f}'}))
-                    st.session_state['last_cc_draft'] = df_draft
+                st.session_state['last_cc_draft'] = df_draft
+                st.session_state['last_cc_key'] = writer.new_key()
 
-            if st.button("💾 Save Capital Call Draft", type="primary"):
-                if 'last_cc_draft' in st.session_state:
-                    try:
-                        batch_data = {"batch_date": str(draft_date), "description": f"Call: {fmt(draft_amount)}", "status": "DRAFT"}
-                        b_resp = supabase.table('batches').insert(batch_data).execute()
-                        new_batch_id = b_resp.data[0]['id']
-                        entries = []
-                        for idx, row in st.session_state['last_cc_draft'].iterrows():
-                            entries.append({"batch_id": new_batch_id, "commitment_id": row['id'], "trans_code": "CC-PRIN", "amount": row['Share']})
-                        supabase.table('ledger_entries').insert(entries).execute()
-                        st.success("✅ Draft Saved!")
-                    except Exception as e:
-                        st.error(str(e))
-                else:
-                    st.error("Please calculate split first.")
+        if st.button("💾 Save Capital Call Draft", type="primary"):
+            if 'last_cc_draft' in st.session_state:
+                try:
+                    batch_data = {"fund_id": fund_id, "batch_date": str(draft_date), "description": f"Call: {fmt(draft_amount)}", "status": "DRAFT"}
+                    df_save = st.session_state['last_cc_draft']
+                    new_batch_id = writer.save_batch(
+                        repo, batch_data,
+                        lambda bid: build_entries(bid, df_save['id'], "CC-PRIN", df_save['share_cents']),
+                        key=st.session_state['last_cc_key'],
+                    )
+                    data.invalidate_batch(fund_id, new_batch_id)
+                    st.success("✅ Draft Saved!")
+                except Exception as e:
+                    st.error(str(e))
+            else:
+                st.error("Please calculate split first.")
 
-    with call_tab2:
-        st.subheader("Review & Post")
-        if supabase:
-            draft_batches = supabase.table('batches').select("*").eq('status', 'DRAFT').ilike('description', '%Call%').execute()
-            if draft_batches.data:
-                batch_options = {f"{b['description']} ({b['batch_date']})": b['id'] for b in draft_batches.data}
-                sel_desc = st.selectbox("Select Call Draft:", list(batch_options.keys()))
-                sel_id = batch_options[sel_desc]
+
+@fragment
+def capital_call_review():
+    st.subheader("Review & Post")
+    if repo and fund_id:
+        draft_batches = data.get_draft_batches(repo, fund_id, 'call')
+        if draft_batches:
+            batch_options = {f"{b['description']} ({b['batch_date']})": b['id'] for b in draft_batches}
+            sel_desc = st.selectbox("Select Call Draft:", list(batch_options.keys()))
+            sel_id = batch_options[sel_desc]
+            
+            draft_entries = data.get_batch_entries(repo, sel_id)
+            if draft_entries:
+                df_rev = pd.DataFrame(draft_entries)
                 
-                draft_entries = supabase.table('ledger_entries').select("*, commitments(investors(display_name))").eq('batch_id', sel_id).execute()
-                if draft_entries.data:
-                    df_rev = pd.DataFrame(draft_entries.data)
-                    df_rev['Investor'] = df_rev['commitments'].apply(lambda x: x['investors']['display_name'])
-                    df_rev['amount'] = df_rev['amount'].astype(float)
-                    
-                    disp = df_rev[['Investor', 'amount']].copy()
-                    disp.index = disp.index + 1
+                disp = df_rev[['Investor', 'amount']].copy()
+                disp.index = disp.index + 1
+                with perf("review.table"):
                     st.table(disp.style.format({'amount': '${:,.2f}'}))
-                    
-                    if st.button("🚀 POST CALL"):
-                        supabase.table('batches').update({"status": "POSTED"}).eq('id', sel_id).execute()
-                        st.success("Posted!")
-                        st.rerun()
-            else:
-                st.info("No pending drafts.")
+                
+                if st.button("🚀 POST CALL"):
+                    snapshots.post_batch(repo, sel_id)
+                    data.invalidate_batch(fund_id, sel_id)
+                    st.success("Posted!")
+                    st.rerun()
+        else:
+            st.info("No pending drafts.")
+
 
-# === TAB 4: P&L ALLOCATION ===
-with tab4:
+# === P&L ALLOCATION ===
+def view_pl():
     st.header("P&L Allocation")
+    prefetch_drafts('pl')
     pl_tab1, pl_tab2 = st.tabs(["1️⃣ Draft P&L", "2️⃣ Review & Post"])
-    
     with pl_tab1:
-        c1, c2, c3 = st.columns(3)
-        with c1:
-            pl_amount = st.number_input("Total Amount ($)", value=10000.00, step=500.00)
-        with c2:
-            type_map = {"Income (Ordinary)": "INC-ORD", "Expense (General)": "EXP-GEN", "Gain (Realized)": "GAIN-RL", "Loss (Realized)": "LOSS-RL"}
-            pl_type = st.selectbox("Transaction Type", list(type_map.keys()))
-            db_code = type_map[pl_type]
-        with c3:
-            pl_date = st.date_input("Trans. Date", key="pl_date")
-        pl_desc = st.text_input("Description", "Q1 Fees")
-
-        if supabase:
-            if st.button("Preview P&L Split"):
-                comm_resp = supabase.table('commitments').select("*, investors(display_name)").execute()
-                if comm_resp.data:
-                    df_pl = pd.DataFrame(comm_resp.data)
-                    df_pl['Investor'] = df_pl['investors'].apply(lambda x: x['display_name'])
-                    total_comm = df_pl['committed_amount'].sum()
-                    df_pl['Share'] = (df_pl['committed_amount'] / total_comm) * pl_amount
-                    st.markdown("### Allocation Preview")
-                    preview_pl = df_pl[['Investor', 'Share']].copy()
-                    preview_pl.index = preview_pl.index + 1
+        pl_draft()
+    with pl_tab2:
+        pl_review()
+
+
+@fragment
+def pl_draft():
+    c1, c2, c3 = st.columns(3)
+    with c1:
+        pl_amount = st.number_input("Total Amount ($)", value=10000.00, step=500.00)
+    with c2:
+        type_map = {"Income (Ordinary)": "INC-ORD", "Expense (General)": "EXP-GEN", "Gain (Realized)": "GAIN-RL", "Loss (Realized)": "LOSS-RL"}
+        pl_type = st.selectbox("Transaction Type", list(type_map.keys()))
+        db_code = type_map[pl_type]
+    with c3:
+        pl_date = st.date_input("Trans. Date", key="pl_date")
+    pl_desc = st.text_input("Description", "Q1 Fees")
+
+    if repo and fund_id:
+        if st.button("Preview P&L Split"):
+            comm_resp = data.get_commitments(repo, fund_id)
+            if comm_resp:
+                df_pl = pd.DataFrame(comm_resp)
+                df_pl['Investor'] = df_pl['investors'].apply(lambda x: x['display_name'])
+                df_pl = pro_rata(df_pl, pl_amount)
+                st.markdown("### Allocation Preview")
+                preview_pl = df_pl[['Investor', 'Share']].copy()
+                preview_pl.index = preview_pl.index + 1
+                with perf("draft.preview_table"):
                     st.table(preview_pl.style.format({'Share': '${:,.2f}'}))
-                    st.session_state['last_pl_draft'] = (df_pl, db_code)
-            
-            if st.button("💾 Save P&L Draft", type="primary"):
-                if 'last_pl_draft' in st.session_state:
-                    df_save, code_save = st.session_state['last_pl_draft']
-                    try:
-                        batch_data = {"batch_date": str(pl_date), "description": f"{pl_type}: {pl_desc}", "status": "DRAFT"}
-                        b_resp = supabase.table('batches').insert(batch_data).execute()
-                        new_batch_id = b_resp.data[0]['id']
-                        entries = []
-                        for idx, row in df_save.iterrows():
-                            entries.append({"batch_id": new_batch_id, "commitment_id": row['id'], "trans_code": code_save, "amount": row['Share']})
-                        supabase.table('ledger_entries').insert(entries).execute()
-                        st.success("✅ P&L Draft Saved!")
-                    except Exception as e:
-                        st.error(str(e))
+                st.session_state['last_pl_draft'] = (df_pl, db_code)
+                st.session_state['last_pl_key'] = writer.new_key()
+        
+        if st.button("💾 Save P&L Draft", type="primary"):
+            if 'last_pl_draft' in st.session_state:
+                df_save, code_save = st.session_state['last_pl_draft']
+                try:
+                    batch_data = {"fund_id": fund_id, "batch_date": str(pl_date), "description": f"{pl_type}: {pl_desc}", "status": "DRAFT"}
+                    new_batch_id = writer.save_batch(
+                        repo, batch_data,
+                        lambda bid: build_entries(bid, df_save['id'], code_save, df_save['share_cents']),
+                        key=st.session_state['last_pl_key'],
+                    )
+                    data.invalidate_batch(fund_id, new_batch_id)
+                    st.success("✅ P&L Draft Saved!")
+                except Exception as e:
+                    st.error(str(e))
 
-    with pl_tab2:
-        st.subheader("Review P&L Drafts")
-        if supabase:
-            # Filter for P&L types (Batches that are NOT Call and NOT Distribution)
-            draft_batches = supabase.table('batches').select("*").eq('status', 'DRAFT').not_.ilike('description', '%Call%').not_.ilike('description', '%Dist%').execute()
-            if draft_batches.data:
-                batch_options = {f"{b['description']} ({b['batch_date']})": b['id'] for b in draft_batches.data}
-                sel_desc = st.selectbox("Select P&L Draft:", list(batch_options.keys()))
-                sel_id = batch_options[sel_desc]
+
+@fragment
+def pl_review():
+    st.subheader("Review P&L Drafts")
+    if repo and fund_id:
+        # Filter for P&L types (Batches that are NOT Call and NOT Distribution)
+        draft_batches = data.get_draft_batches(repo, fund_id, 'pl')
+        if draft_batches:
+            batch_options = {f"{b['description']} ({b['batch_date']})": b['id'] for b in draft_batches}
+            sel_desc = st.selectbox("Select P&L Draft:", list(batch_options.keys()))
+            sel_id = batch_options[sel_desc]
+            
+            draft_entries = data.get_batch_entries(repo, sel_id)
+            if draft_entries:
+                df_rev = pd.DataFrame(draft_entries)
                 
-                draft_entries = supabase.table('ledger_entries').select("*, commitments(investors(display_name))").eq('batch_id', sel_id).execute()
-                if draft_entries.data:
-                    df_rev = pd.DataFrame(draft_entries.data)
-                    df_rev['Investor'] = df_rev['commitments'].apply(lambda x: x['investors']['display_name'])
-                    df_rev['amount'] = df_rev['amount'].astype(float)
-                    
-                    disp = df_rev[['Investor', 'trans_code', 'amount']].copy()
-                    disp.index = disp.index + 1
+                disp = df_rev[['Investor', 'trans_code', 'amount']].copy()
+                disp.index = disp.index + 1
+                with perf("review.table"):
                     st.table(disp.style.format({'amount': '${:,.2f}'}))
-                    
-                    c1, c2 = st.columns([1,4])
-                    with c1:
-                        if st.button("🚀 POST P&L"):
-                            supabase.table('batches').update({"status": "POSTED"}).eq('id', sel_id).execute()
-                            st.success("Posted!")
-                            st.rerun()
-                    with c2:
-                        if st.button("🗑️ DELETE"):
-                             supabase.table('ledger_entries').delete().eq('batch_id', sel_id).execute()
-                             supabase.table('batches').delete().eq('id', sel_id).execute()
-                             st.rerun()
-            else:
-                st.info("No pending P&L drafts.")
+                
+                c1, c2 = st.columns([1,4])
+                with c1:
+                    if st.button("🚀 POST P&L"):
+                        snapshots.post_batch(repo, sel_id)
+                        data.invalidate_batch(fund_id, sel_id)
+                        st.success("Posted!")
+                        st.rerun()
+                with c2:
+                    if st.button("🗑️ DELETE"):
+                         snapshots.delete_batch(repo, sel_id)
+                         data.invalidate_batch(fund_id, sel_id)
+                         st.rerun()
+        else:
+            st.info("No pending P&L drafts.")
+
 
-# === TAB 5: DISTRIBUTIONS (NEW!) ===
-with tab5:
+# === DISTRIBUTIONS ===
+def view_distributions():
     st.header("Distributions (Cash Out)")
     st.markdown("Distribute cash to investors. Choose **Return of Capital** (ROC) or **Gain**.")
     
+    prefetch_drafts('dist')
     dist_tab1, dist_tab2 = st.tabs(["1️⃣ Draft Distribution", "2️⃣ Review & Post"])
-    
     with dist_tab1:
-        c1, c2, c3 = st.columns(3)
-        with c1:
-            dist_amount = st.number_input("Total Distribution ($)", value=50000.00, step=5000.00)
-        with c2:
-            # Code map for distributions
-            dist_map = {"Return of Capital": "DIST-ROC", "Realized Gain Dist": "DIST-GAIN"}
-            dist_type = st.selectbox("Distribution Type", list(dist_map.keys()))
-            dist_code = dist_map[dist_type]
-        with c3:
-            dist_date = st.date_input("Date", key="dist_date")
-            
-        if supabase:
-            if st.button("Preview Distribution"):
-                comm_resp = supabase.table('commitments').select("*, investors(display_name)").execute()
-                if comm_resp.data:
-                    df_dist = pd.DataFrame(comm_resp.data)
-                    df_dist['Investor'] = df_dist['investors'].apply(lambda x: x['display_name'])
-                    total_comm = df_dist['committed_amount'].sum()
-                    
-                    # Pro-rata Split
-                    df_dist['Share'] = (df_dist['committed_amount'] / total_comm) * dist_amount
-                    
-                    st.markdown("### Allocation Preview")
-                    preview_dist = df_dist[['Investor', 'Share']].copy()
-                    preview_dist.index = preview_dist.index + 1
+        distribution_draft()
+    with dist_tab2:
+        distribution_review()
+
+
+@fragment
+def distribution_draft():
+    c1, c2, c3 = st.columns(3)
+    with c1:
+        dist_amount = st.number_input("Total Distribution ($)", value=50000.00, step=5000.00)
+    with c2:
+        # Code map for distributions
+        dist_map = {"Return of Capital": "DIST-ROC", "Realized Gain Dist": "DIST-GAIN"}
+        dist_type = st.selectbox("Distribution Type", list(dist_map.keys()))
+        dist_code = dist_map[dist_type]
+    with c3:
+        dist_date = st.date_input("Date", key="dist_date")
+        
+    if repo and fund_id:
+        if st.button("Preview Distribution"):
+            comm_resp = data.get_commitments(repo, fund_id)
+            if comm_resp:
+                df_dist = pd.DataFrame(comm_resp)
+                df_dist['Investor'] = df_dist['investors'].apply(lambda x: x['display_name'])
+                
+                # Pro-rata Split
+                df_dist = pro_rata(df_dist, dist_amount)
+                
+                st.markdown("### Allocation Preview")
+                preview_dist = df_dist[['Investor', 'Share']].copy()
+                preview_dist.index = preview_dist.index + 1
+                with perf("draft.preview_table"):
                     st.table(preview_dist.style.format({'Share': '${:,.2f}'}))
-                    
-                    st.session_state['last_dist_draft'] = (df_dist, dist_code)
-            
-            if st.button("💾 Save Distribution Draft", type="primary"):
-                if 'last_dist_draft' in st.session_state:
-                    df_save, code_save = st.session_state['last_dist_draft']
-                    try:
-                        batch_data = {
-                            "batch_date": str(dist_date), 
-                            "description": f"Dist ({dist_type}): {fmt(dist_amount)}", 
-                            "status": "DRAFT"
-                        }
-                        b_resp = supabase.table('batches').insert(batch_data).execute()
-                        new_batch_id = b_resp.data[0]['id']
-                        
-                        entries = []
-                        for idx, row in df_save.iterrows():
-                            entries.append({
-                                "batch_id": new_batch_id, 
-                                "commitment_id": row['id'], 
-                                "trans_code": code_save, 
-                                "amount": row['Share']
-                            })
-                        supabase.table('ledger_entries').insert(entries).execute()
-                        st.success("✅ Distribution Draft Saved!")
-                    except Exception as e:
-                        st.error(str(e))
+                
+                st.session_state['last_dist_draft'] = (df_dist, dist_code)
+                st.session_state['last_dist_key'] = writer.new_key()
+        
+        if st.button("💾 Save Distribution Draft", type="primary"):
+            if 'last_dist_draft' in st.session_state:
+                df_save, code_save = st.session_state['last_dist_draft']
+                try:
+                    batch_data = {
+                        "fund_id": fund_id,
+                        "batch_date": str(dist_date), 
+                        "description": f"Dist ({dist_type}): {fmt(dist_amount)}", 
+                        "status": "DRAFT"
+                    }
+                    new_batch_id = writer.save_batch(
+                        repo, batch_data,
+                        lambda bid: build_entries(bid, df_save['id'], code_save, df_save['share_cents']),
+                        key=st.session_state['last_dist_key'],
+                    )
+                    data.invalidate_batch(fund_id, new_batch_id)
+                    st.success("✅ Distribution Draft Saved!")
+                except Exception as e:
+                    st.error(str(e))
 
-    with dist_tab2:
-        st.subheader("Review Distribution Drafts")
-        if supabase:
-            # Filter for Distributions only
-            draft_batches = supabase.table('batches').select("*").eq('status', 'DRAFT').ilike('description', '%Dist%').execute()
+
+@fragment
+def distribution_review():
+    st.subheader("Review Distribution Drafts")
+    if repo and fund_id:
+        # Filter for Distributions only
+        draft_batches = data.get_draft_batches(repo, fund_id, 'dist')
+        
+        if draft_batches:
+            batch_options = {f"{b['description']} ({b['batch_date']})": b['id'] for b in draft_batches}
+            sel_desc = st.selectbox("Select Dist Draft:", list(batch_options.keys()))
+            sel_id = batch_options[sel_desc]
             
-            if draft_batches.data:
-                batch_options = {f"{b['description']} ({b['batch_date']})": b['id'] for b in draft_batches.data}
-                sel_desc = st.selectbox("Select Dist Draft:", list(batch_options.keys()))
-                sel_id = batch_options[sel_desc]
+            draft_entries = data.get_batch_entries(repo, sel_id)
+            if draft_entries:
+                df_rev = pd.DataFrame(draft_entries)
                 
-                draft_entries = supabase.table('ledger_entries').select("*, commitments(investors(display_name))").eq('batch_id', sel_id).execute()
-                if draft_entries.data:
-                    df_rev = pd.DataFrame(draft_entries.data)
-                    df_rev['Investor'] = df_rev['commitments'].apply(lambda x: x['investors']['display_name'])
-                    df_rev['amount'] = df_rev['amount'].astype(float)
-                    
-                    disp = df_rev[['Investor', 'trans_code', 'amount']].copy()
-                    disp.index = disp.index + 1
+                disp = df_rev[['Investor', 'trans_code', 'amount']].copy()
+                disp.index = disp.index + 1
+                with perf("review.table"):
                     st.table(disp.style.format({'amount': '${:,.2f}'}))
-                    
-                    c1, c2 = st.columns([1,4])
-                    with c1:
-                        if st.button("🚀 POST DISTRIBUTION"):
-                            supabase.table('batches').update({"status": "POSTED"}).eq('id', sel_id).execute()
-                            st.success("Posted!")
-                            st.rerun()
-                    with c2:
-                        if st.button("🗑️ DELETE"):
-                             supabase.table('ledger_entries').delete().eq('batch_id', sel_id).execute()
-                             supabase.table('batches').delete().eq('id', sel_id).execute()
-                             st.rerun()
-            else:
-                st.info("No pending Distribution drafts.")
+                
+                c1, c2 = st.columns([1,4])
+                with c1:
+                    if st.button("🚀 POST DISTRIBUTION"):
+                        snapshots.post_batch(repo, sel_id)
+                        data.invalidate_batch(fund_id, sel_id)
+                        st.success("Posted!")
+                        st.rerun()
+                with c2:
+                    if st.button("🗑️ DELETE"):
+                         snapshots.delete_batch(repo, sel_id)
+                         data.invalidate_batch(fund_id, sel_id)
+                         st.rerun()
+        else:
+            st.info("No pending Distribution drafts.")
+
 
-# === TAB 3: LIVE PCAP STATEMENT (FINAL) ===
-with tab3:
+# === LIVE PCAP STATEMENT ===
+def view_pcap():
     st.header("Partner Capital Account (Live)")
     st.markdown("Real-time view. **Note:** Distributions decrease Ending Capital.")
     
-    if supabase:
-        all_inv = supabase.table('investors').select("*").execute()
-        inv_map = {i['display_name']: i['id'] for i in all_inv.data} if all_inv.data else {}
+    if repo and fund_id:
+        # Only investors with a commitment in the selected fund are listed.
+        inv_map = {c['investors']['display_name']: c['investor_id'] for c in data.get_commitments(repo, fund_id) if c['investors']}
         
         if inv_map:
             sel_inv_name = st.selectbox("Select Investor:", list(inv_map.keys()))
-            comm_res = supabase.table('commitments').select("*").eq('investor_id', inv_map[sel_inv_name]).execute()
+            as_of = st.date_input("As of (blank = all posted)", value=None, key="pcap_as_of")
+            comm_res = data.get_investor_commitments(repo, fund_id, inv_map[sel_inv_name])
             
-            if comm_res.data:
-                sel_comm_id = comm_res.data[0]['id']
-                total_commitment = float(comm_res.data[0]['committed_amount'])
+            if comm_res:
+                sel_comm_id = comm_res[0]['id']
+                total_commitment = float(comm_res[0]['committed_amount'])
                 
-                # Query Posted Transactions
-                ledger_res = supabase.table('ledger_entries').select("*, batches!inner(status, batch_date)").eq('commitment_id', sel_comm_id).execute()
+                # Totals are aggregated server-side over POSTED batches; past
+                # dates read the nearest balance snapshot instead.
+                totals, history = fetch.gather(
+                    lambda: pcap.fetch_pcap_totals(repo, fund_id, sel_comm_id) if as_of is None
+                    else snapshots.balance_as_of(repo, fund_id, as_of, sel_comm_id),
+                    lambda: pcap.fetch_posted_history(repo, fund_id, sel_comm_id, as_of),
+                )
                 
-                if ledger_res.data:
-                    raw_df = pd.DataFrame(ledger_res.data)
-                    raw_df['status'] = raw_df['batches'].apply(lambda x: x['status'])
-                    raw_df['date'] = raw_df['batches'].apply(lambda x: x['batch_date'])
+                if totals:
+                    acct = pcap.capital_account(totals, total_commitment)
+                    ending_balance = acct['ending_balance']
+                    unfunded_balance = acct['unfunded_balance']
+                    
+                    # Metrics
+                    m1, m2, m3, m4, m5 = st.columns(5)
                     
-                    posted_df = raw_df[raw_df['status'] == 'POSTED'].copy()
+                    m1.metric("Total Commitment", fmt(total_commitment))
+                    m2.metric("Unfunded Balance", fmt(unfunded_balance)) 
+                    m3.metric("Total Distributed", fmt(acct['distributions']))
+                    m4.metric("Net Income (P&L)", fmt(acct['net_income']))
+                    m5.metric("Ending Capital", fmt(ending_balance))
                     
-                    if not posted_df.empty:
-                        posted_df['amount'] = posted_df['amount'].astype(float)
-                        
-                        # --- ACCOUNTING LOGIC ---
-                        contributions = posted_df[posted_df['trans_code'] == 'CC-PRIN']['amount'].sum()
-                        additions = posted_df[posted_df['trans_code'].isin(['INC-ORD', 'GAIN-RL'])]['amount'].sum()
-                        deductions = posted_df[posted_df['trans_code'].isin(['EXP-GEN', 'LOSS-RL'])]['amount'].sum()
-                        
-                        # Distributions (Both ROC and Gain decrease the capital account)
-                        distributions = posted_df[posted_df['trans_code'].isin(['DIST-ROC', 'DIST-GAIN'])]['amount'].sum()
-                        
-                        # Calculations
-                        ending_balance = contributions + additions - deductions - distributions
-                        unfunded_balance = total_commitment - contributions
-                        
-                        # Metrics
-                        m1, m2, m3, m4, m5 = st.columns(5)
-                        
-                        m1.metric("Total Commitment", fmt(total_commitment))
-                        m2.metric("Unfunded Balance", fmt(unfunded_balance)) 
-                        m3.metric("Total Distributed", fmt(distributions))
-                        m4.metric("Net Income (P&L)", fmt(additions - deductions))
-                        m5.metric("Ending Capital", fmt(ending_balance))
-                        
-                        st.divider()
-                        st.subheader("Transaction History")
-                        hist_df = posted_df[['date', 'trans_code', 'amount']].copy()
-                        hist_df.columns = ["Date", "Type", "Amount"]
-                        hist_df.index = hist_df.index + 1
-                        
-                        # Color coding: Expenses AND Distributions are negative logic
-                        def format_accounting(row):
-                            val = row['Amount']
-                            code = row['Type']
-                            if code in ['EXP-GEN', 'LOSS-RL', 'DIST-ROC', 'DIST-GAIN']:
-                                return f"({fmt(val)})"
-                            return fmt(val)
+                    st.divider()
+                    st.subheader("Transaction History")
+                    posted_df = pd.DataFrame(history)
+                    hist_df = posted_df.copy()
+                    hist_df.columns = ["Date", "Type", "Amount"]
+                    hist_df.index = hist_df.index + 1
+                    
+                    # Color coding: Expenses AND Distributions are negative logic
+                    def format_accounting(row):
+                        val = row['Amount']
+                        code = row['Type']
+                        if code in pcap.DEBIT_CODES:
+                            return f"({fmt(val)})"
+                        return fmt(val)
 
+                    with perf("pcap.history_table"):
                         hist_df['Display Amount'] = hist_df.apply(format_accounting, axis=1)
                         st.table(hist_df[['Date', 'Type', 'Display Amount']].style.set_properties(
                             subset=['Display Amount'], **{'text-align': 'right'}
                         ))
-                        
-                        st.divider()
-                        pdf_bytes = create_pdf(sel_inv_name, "Harbor View Fund I", ending_balance, unfunded_balance, posted_df)
+                    
+                    st.divider()
+                    try:
+                        with perf("pcap.create_pdf"):
+                            pdf_bytes = create_pdf(sel_inv_name, fund_name, ending_balance, unfunded_balance, posted_df, as_of=as_of)
                         st.download_button("📥 Download Official Statement", pdf_bytes, "statement.pdf", "application/pdf")
-                    else:
-                        st.info("No posted transactions yet.")
+                    except FPDFUnicodeEncodingException:
+                        st.error("This name can't be printed with the built-in PDF font; set FUNDLITE_PDF_FONT to a Unicode .ttf file.")
                 else:
-                    st.info("No activity found.")
+                    st.info("No posted transactions yet.")
             else:
                 st.warning("No commitment found.")
+        
+        pcap_bulk_statements()
+
+
+@fragment
+def pcap_bulk_statements():
+    st.divider()
+    st.subheader("Bulk Statements (All Investors)")
+    if st.button("📦 Generate All Statements"):
+        bar = st.progress(0.0, text="Rendering statements...")
+        # Same "As of" date as the single statement above.
+        st.session_state['bulk_statements'], st.session_state['bulk_failed'] = statements.run_fund_statements(
+            repo, fund_id, data.get_commitments(repo, fund_id), fund_name,
+            progress=lambda done, total: bar.progress(done / total, text=f"{done}/{total} statements"),
+            as_of=st.session_state.get('pcap_as_of'),
+        )
+    if st.session_state.get('bulk_failed'):
+        names = ", ".join(name for name, _ in st.session_state['bulk_failed'])
+        st.warning(f"Left out of the ZIP (see FUNDLITE_PDF_FONT for non-Latin names): {names}")
+    if 'bulk_statements' in st.session_state:
+        st.download_button("📥 Download All Statements (ZIP)", st.session_state['bulk_statements'], "statements.zip", "application/zip")
+
+
+# --- 5. NAVIGATION ---
+pg = st.navigation([
+    st.Page(view_overview, title="Fund Overview", icon="📊", default=True),
+    st.Page(view_capital_calls, title="Capital Calls", icon="📢"),
+    st.Page(view_pl, title="P&L Allocation", icon="📈"),
+    st.Page(view_distributions, title="Distributions", icon="💸"),
+    st.Page(view_pcap, title="Live PCAP Statement", icon="📄"),
+])
+try:
+    with perf(f"page.{pg.title}"):
+        pg.run()
+
+    if recorder and show_perf:
+        with st.sidebar:
+            instrument.render_panel(recorder)
+finally:
+    full_run = False
@@ -0,0 +1,149 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import pandas as pd
+
+import data
+import pcap
+import statements
+import storage
+import synth
+from allocation import build_entries, pro_rata
+
+# Benchmarks for the hot paths, run against a synthetic fund in a local
+# SQLite database.
+#
+#   python bench.py --sizes 10 1000 100000 --batches 20
+#   python bench.py --save-baseline          # record bench_baseline.json
+#
+# Results slower than the baseline by more than --tolerance, and by at least
+# --min-delta in absolute terms, are flagged and the run exits non-zero. The committed bench_baseline.json was recorded with
+# the defaults; timings are machine-specific, so re-save it on the machine
+# that runs the comparison.
+
+DEFAULT_SIZES = [10, 100, 1000, 10000, 100000]
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_baseline.json')
+
+# create_pdf_long: one statement this many rows long, enough for several pages.
+LONG_HISTORY_ROWS = 2000
+
+# statements_bulk: the whole-fund reads plus this many statements rendered
+# (fewer for small funds), so large sizes don't spend minutes in the PDF pool.
+BULK_STATEMENTS = 200
+
+
+def timeit(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return {'min': min(times), 'median': statistics.median(times)}
+
+
+def bench_size(n, n_batches, repeat, db=':memory:'):
+    repo = storage.SQLiteRepository(db)
+    fund_id = synth.populate(repo, n, n_batches)['fund_id']
+    data.cache.clear()
+    commitments = pd.DataFrame(repo.list_commitments(fund_id))
+    drafts = [b for kind in ('call', 'pl', 'dist') for b in repo.list_draft_batches(fund_id, kind)]
+    draft_id = drafts[0]['id'] if drafts else None
+
+    def split():
+        df = pro_rata(commitments, 1_000_000)
+        build_entries(0, df['id'], 'CC-PRIN', df['share_cents'])
+
+    def review():
+        data.cache.clear()
+        if draft_id is not None:
+            data.get_batch_entries(repo, draft_id)
+
+    first = int(commitments['id'].iloc[0])
+    history = pcap.fetch_posted_history(repo, fund_id, first)
+
+    def pdf():
+        statements.renderer.render(
+            "Investor 000001", "Benchmark Fund", 0, 0,
+            history['date'], history['trans_code'], history['amount'],
+        )
+
+    reps = -(-LONG_HISTORY_ROWS // max(len(history['date']), 1))
+    long_history = {k: (v * reps)[:LONG_HISTORY_ROWS] for k, v in history.items()}
+
+    def pdf_long():
+        statements.renderer.render(
+            "Investor 000001", "Benchmark Fund", 0, 0,
+            long_history['date'], long_history['trans_code'], long_history['amount'],
+        )
+
+    bulk = repo.list_commitments(fund_id)[:BULK_STATEMENTS]
+
+    def statements_bulk():
+        statements.run_fund_statements(repo, fund_id, bulk, "Benchmark Fund")
+
+    return {
+        'split': timeit(split, repeat),
+        'pcap_one': timeit(lambda: pcap.fetch_pcap_totals(repo, fund_id, first), repeat),
+        'pcap_all': timeit(lambda: pcap.fetch_all_pcap_totals(repo, fund_id), repeat),
+        'draft_review': timeit(review, repeat),
+        'create_pdf': timeit(pdf, repeat),
+        'create_pdf_long': timeit(pdf_long, repeat),
+        'statements_bulk': timeit(statements_bulk, repeat),
+    }
+
+
+def compare(results, baseline, tolerance, min_delta=0):
+    # min_delta (seconds) keeps sub-millisecond cases from flagging on timer jitter.
+    regressions = []
+    for size, cases in results.items():
+        for case, stats in cases.items():
+            base = baseline.get(size, {}).get(case)
+            if base and stats['min'] > max(base['min'] * (1 + tolerance), base['min'] + min_delta):
+                regressions.append((size, case, base['min'], stats['min']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark FundLite hot paths on synthetic data.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="commitment counts")
+    parser.add_argument('--batches', type=int, default=20, help="batches per fund")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    # Back-to-back runs on one machine vary by 20-35%; a tighter default flaps.
+    parser.add_argument('--tolerance', type=float, default=0.5, help="allowed slowdown vs baseline (0.5 = 50%%)")
+    parser.add_argument('--min-delta', type=float, default=0.005, help="ignore slowdowns smaller than this many seconds")
+    parser.add_argument('--json', action='store_true', help="print results as JSON")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for n in args.sizes:
+        results[str(n)] = bench_size(n, args.batches, args.repeat)
+        if not args.json:
+            for case, stats in results[str(n)].items():
+                print(f"{n:>8} {case:<16} min {stats['min'] * 1000:10.2f} ms   median {stats['median'] * 1000:10.2f} ms")
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.min_delta)
+        for size, case, base, now in regressions:
+            print(f"REGRESSION {size} {case}: {base * 1000:.2f} ms -> {now * 1000:.2f} ms", file=sys.stderr)
+        return 1 if regressions else 0
+    print(f"no baseline at {args.baseline}; nothing compared (record one with --save-baseline)", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,160 @@
+import argparse
+import os
+import sys
+
+import export
+import snapshots
+import statements
+import storage
+import writer
+
+# Headless entry point for scheduled jobs: the same allocation, posting and
+# statement code the app uses, without the Streamlit runtime.
+#
+#   python cli.py allocate calls.csv              # drafts, one per CSV row
+#   python cli.py allocate calls.csv --post       # ...posted straight away
+#   python cli.py import ledger.csv --fund "Harbor View Fund I"
+#   python cli.py post --fund "Harbor View Fund I" --kind call
+#   python cli.py statements --out statements/    # one ZIP per fund
+#   python cli.py statements --out statements/ --as-of 2024-03-31
+#   python cli.py export ledger.parquet --state export_state.json
+#   python cli.py snapshots rebuild               # seed/repair balance snapshots
+#
+# The hosted database is read from SUPABASE_URL / SUPABASE_KEY; --backend
+# sqlite (or FUNDLITE_BACKEND) uses the local file named by --db / FUNDLITE_DB.
+
+
+def fund_lookup(repo):
+    # CSV and --fund values may be a fund name or its id.
+    funds = repo.list_funds()
+    lookup = {f['name']: f['id'] for f in funds}
+    lookup.update({str(f['id']): f['id'] for f in funds})
+    return funds, lookup
+
+
+def select_funds(repo, names):
+    funds, lookup = fund_lookup(repo)
+    if not names:
+        return funds
+    unknown = [n for n in names if n not in lookup]
+    if unknown:
+        raise ValueError(f"unknown fund {', '.join(unknown)}")
+    wanted = {lookup[n] for n in names}
+    return [f for f in funds if f['id'] in wanted]
+
+
+def cmd_allocate(repo, args):
+    _, lookup = fund_lookup(repo)
+    final_status = 'POSTED' if args.post else None
+    batch_ids = writer.allocate_csv(repo, args.csv, lookup, final_status=final_status)
+    print(f"{len(batch_ids)} batches {'posted' if args.post else 'saved as drafts'}")
+
+
+def cmd_import(repo, args):
+    fund = select_funds(repo, [args.fund])[0]
+    batch_ids = writer.import_ledger_csv(repo, fund['id'], args.csv)
+    print(f"{len(batch_ids)} batches imported into {fund['name']}")
+
+
+def cmd_post(repo, args):
+    kinds = [args.kind] if args.kind else list(storage.BATCH_KINDS)
+    for fund in select_funds(repo, args.fund):
+        drafts = [b for kind in kinds for b in repo.list_draft_batches(fund['id'], kind)]
+        if args.through:
+            drafts = [b for b in drafts if str(b['batch_date']) <= args.through]
+        posted = snapshots.post_batches(repo, [b['id'] for b in drafts])
+        print(f"{fund['name']}: {len(posted)} batches posted")
+
+
+def cmd_statements(repo, args):
+    os.makedirs(args.out, exist_ok=True)
+    failed = []
+    for fund in select_funds(repo, args.fund):
+        suffix = f"_{args.as_of}" if args.as_of else ""
+        path = os.path.join(args.out, f"{statements.safe_name(fund['name'])}{suffix}.zip")
+        _, fund_failed = statements.run_fund_statements(
+            repo, fund['id'], repo.list_commitments(fund['id']), fund['name'],
+            out=path, workers=args.workers, as_of=args.as_of,
+        )
+        print(f"{fund['name']}: {path}")
+        for filename, error in fund_failed:
+            print(f"  not rendered: {filename}: {error}", file=sys.stderr)
+        failed.extend(fund_failed)
+    if failed:
+        raise ValueError(f"{len(failed)} statements could not be rendered (set FUNDLITE_PDF_FONT to a Unicode TTF for non-Latin names)")
+
+
+def cmd_export(repo, args):
+    fund_ids = [f['id'] for f in select_funds(repo, args.fund)] if args.fund else None
+    result = export.export_ledger(repo, args.out, fund_ids, args.start, args.end, args.state)
+    print(f"{result['rows']} entries from {result['batches']} batches written to {args.out}")
+
+
+def cmd_snapshots_rebuild(repo, args):
+    for fund in select_funds(repo, args.fund):
+        rows = snapshots.rebuild(repo, fund['id'])
+        print(f"{fund['name']}: {rows} snapshots rebuilt")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run FundLite batch jobs without the UI.")
+    parser.add_argument('--backend', choices=['supabase', 'sqlite'], default=os.environ.get('FUNDLITE_BACKEND', 'supabase'))
+    parser.add_argument('--db', help="SQLite file (default FUNDLITE_DB or fundlite.db)")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('allocate', help="pro-rata batches from a CSV (fund, batch_date, trans_code, amount[, memo])")
+    p.add_argument('csv')
+    p.add_argument('--post', action='store_true', help="post each batch instead of leaving a draft")
+    p.set_defaults(run=cmd_allocate)
+
+    p = sub.add_parser('import', help="import ledger rows (see writer.IMPORT_COLUMNS) into one fund")
+    p.add_argument('csv')
+    p.add_argument('--fund', required=True)
+    p.set_defaults(run=cmd_import)
+
+    p = sub.add_parser('post', help="post draft batches")
+    p.add_argument('--fund', action='append', help="fund name or id (repeatable; default all funds)")
+    p.add_argument('--kind', choices=list(storage.BATCH_KINDS))
+    p.add_argument('--through', help="only drafts dated on or before this date (YYYY-MM-DD)")
+    p.set_defaults(run=cmd_post)
+
+    p = sub.add_parser('statements', help="render every investor's statement, one ZIP per fund")
+    p.add_argument('--fund', action='append', help="fund name or id (repeatable; default all funds)")
+    p.add_argument('--out', required=True, help="output directory")
+    p.add_argument('--workers', type=int)
+    p.add_argument('--as-of', help="statements as at this date, e.g. a quarter end (YYYY-MM-DD)")
+    p.set_defaults(run=cmd_statements)
+
+    p = sub.add_parser('export', help="stream the posted ledger to .parquet (needs pyarrow) or .csv")
+    p.add_argument('out')
+    p.add_argument('--fund', action='append', help="fund name or id (repeatable; default all funds)")
+    p.add_argument('--start', help="first batch_date to include (YYYY-MM-DD)")
+    p.add_argument('--end', help="last batch_date to include (YYYY-MM-DD)")
+    p.add_argument('--state', help="JSON file holding the last export's watermark; only newer postings are exported")
+    p.set_defaults(run=cmd_export)
+
+    p = sub.add_parser('snapshots', help="maintain balance snapshots")
+    snap = p.add_subparsers(dest='snapshots_command', required=True)
+    p = snap.add_parser('rebuild', help="recompute snapshots from the posted ledger (required after sql/balance_snapshots.sql)")
+    p.add_argument('--fund', action='append', help="fund name or id (repeatable; default all funds)")
+    p.set_defaults(run=cmd_snapshots_rebuild)
+
+    args = parser.parse_args(argv)
+
+    # An unattended job must not quietly write to a local file instead.
+    try:
+        repo = storage.connect(os.environ.get('SUPABASE_URL'), os.environ.get('SUPABASE_KEY'), args.backend, args.db,
+                               fallback=False)
+    except Exception as e:
+        print(f"could not connect to {args.backend}: {e}", file=sys.stderr)
+        return 2
+    try:
+        args.run(repo, args)
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
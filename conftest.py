@@ -0,0 +1,45 @@
+import time
+
+import pytest
+
+import storage
+import synth
+
+# Shared fixtures, all on in-memory SQLite. repo: two hand-built funds with
+# COMMITTED[fund_id] as the commitment amounts. synth_repo: two synthetic
+# funds, Alpha (id 1) and Beta (id 2), each with some batches left in DRAFT.
+
+COMMITTED = {1: [250_000, 100_000, 650_000], 2: [40_000, 60_000]}
+
+
+@pytest.fixture
+def repo():
+    repo = storage.SQLiteRepository(':memory:')
+    with repo.conn:
+        next_id = 1
+        for fund_id, amounts in COMMITTED.items():
+            repo.conn.execute("insert into funds (id, name) values (?, ?)", (fund_id, f"Fund {fund_id}"))
+            for amount in amounts:
+                repo.conn.execute("insert into investors (id, display_name) values (?, ?)", (next_id, f"LP {next_id}"))
+                repo.conn.execute(
+                    "insert into commitments (id, fund_id, investor_id, committed_amount) values (?, ?, ?, ?)",
+                    (next_id, fund_id, next_id, amount),
+                )
+                next_id += 1
+    return repo
+
+
+@pytest.fixture
+def synth_repo():
+    repo = storage.SQLiteRepository(':memory:')
+    synth.populate(repo, 12, 30, draft_ratio=0.3, seed=1, fund_name="Alpha")
+    synth.populate(repo, 5, 10, draft_ratio=0.3, seed=2, fund_name="Beta")
+    # posted_at has millisecond resolution; keep later postings apart from these.
+    time.sleep(0.01)
+    return repo
+
+
+@pytest.fixture
+def drafts(synth_repo):
+    # drafts(fund_id) -> ids of the fund's DRAFT batches, every kind.
+    return lambda fund_id: [b['id'] for kind in storage.BATCH_KINDS for b in synth_repo.list_draft_batches(fund_id, kind)]
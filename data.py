@@ -0,0 +1,95 @@
+import threading
+import time
+from collections import OrderedDict
+
+# In-process cache for reference data read on every Streamlit rerun.
+# Keys are tuples whose first element is the table name, so writes can
+# invalidate exactly the tables they touch.
+
+DEFAULT_TTL = 300
+DEFAULT_MAXSIZE = 256
+
+class TTLCache:
+    def __init__(self, ttl=DEFAULT_TTL, maxsize=DEFAULT_MAXSIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, table, *parts):
+        # Drop every key for `table`, or only those starting with (table, *parts).
+        prefix = (table,) + parts
+        with self._lock:
+            for key in [k for k in self._data if k[:len(prefix)] == prefix]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+cache = TTLCache()
+
+
+def _cached(key, fetch):
+    value = cache.get(key)
+    if value is None:
+        value = fetch()
+        cache.set(key, value)
+    return value
+
+
+def get_funds(repo):
+    return _cached(('funds',), repo.list_funds)
+
+
+# Fund data is keyed (table, fund_id, ...) so each fund has its own partition
+# and a write only invalidates the fund it touched.
+
+def get_commitments(repo, fund_id):
+    return _cached(('commitments', fund_id), lambda: repo.list_commitments(fund_id))
+
+
+def get_investor_commitments(repo, fund_id, investor_id):
+    return [c for c in get_commitments(repo, fund_id) if c['investor_id'] == investor_id]
+
+
+def get_draft_batches(repo, fund_id, kind):
+    return _cached(('batches', fund_id, 'DRAFT', kind), lambda: repo.list_draft_batches(fund_id, kind))
+
+
+def get_batch_entries(repo, batch_id):
+    # Flat rows (Investor, trans_code, amount) so the review table needs no nested-dict unpacking.
+    return _cached(('ledger_entries', batch_id), lambda: repo.batch_entries(batch_id))
+
+
+def get_fund_totals(repo, fund_id):
+    return _cached(('pcap_totals', fund_id), lambda: repo.pcap_totals(fund_id))
+
+
+def invalidate_batch(fund_id, batch_id=None):
+    # A batch was saved, posted or deleted: the fund's draft listings, its
+    # totals and the batch's entries are stale.
+    cache.invalidate('batches', fund_id)
+    cache.invalidate('pcap_totals', fund_id)
+    if batch_id is not None:
+        cache.invalidate('ledger_entries', batch_id)
@@ -0,0 +1,170 @@
+import json
+import os
+
+import pandas as pd
+
+import pcap
+import reader
+import storage
+
+# Streaming export of the posted ledger, joined with fund, batch, commitment
+# and investor details, to Parquet (needs pyarrow) or CSV. Entries are read
+# page by page and written out as they arrive, so memory holds one row group
+# plus the reference data (funds, commitments, matching batches), whatever
+# the size of the ledger.
+#
+# With a state file, a run exports only batches posted since the previous run
+# and then records the new posted_at watermark (sql/posted_at.sql). Deleting
+# an already-exported batch is not reflected in later incremental files.
+#
+# An incremental run covers posted_at in (previous watermark, upper], with one
+# upper bound read from the database clock before any fund is listed, minus
+# EXPORT_LAG_SECONDS. posted_at is stamped at transaction start, so a posting
+# that commits late still lands above a bound taken that far behind the clock;
+# batches posted within the lag are picked up by the next run. Without a state
+# file there is no next run, so everything posted so far is exported.
+
+EXPORT_COLUMNS = [
+    'ledger_id', 'fund_id', 'fund', 'batch_id', 'batch_date', 'description', 'posted_at',
+    'commitment_id', 'investor_id', 'investor', 'trans_code', 'category', 'amount',
+]
+
+ROW_GROUP_ROWS = 100_000
+
+EXPORT_LAG_SECONDS = 120
+
+
+class _CsvSink:
+    def __init__(self, path):
+        self.f = open(path, 'w', newline='')
+        pd.DataFrame(columns=EXPORT_COLUMNS).to_csv(self.f, index=False)
+
+    def write(self, df):
+        df.to_csv(self.f, header=False, index=False)
+
+    def close(self):
+        self.f.close()
+
+
+class _ParquetSink:
+    def __init__(self, path, row_group_rows=ROW_GROUP_ROWS):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError("Parquet export needs pyarrow; install it or export to a .csv path")
+        self.pa = pa
+        self.schema = pa.schema([
+            ('ledger_id', pa.int64()), ('fund_id', pa.int64()), ('fund', pa.string()),
+            ('batch_id', pa.int64()), ('batch_date', pa.date32()), ('description', pa.string()),
+            ('posted_at', pa.string()), ('commitment_id', pa.int64()), ('investor_id', pa.int64()),
+            ('investor', pa.string()), ('trans_code', pa.string()), ('category', pa.string()),
+            ('amount', pa.float64()),
+        ])
+        self.writer = pq.ParquetWriter(path, self.schema)
+        self.row_group_rows = row_group_rows
+        self.pending = []
+        self.pending_rows = 0
+
+    def write(self, df):
+        # Pages are smaller than a useful row group; buffer up to row_group_rows.
+        self.pending.append(df)
+        self.pending_rows += len(df)
+        if self.pending_rows >= self.row_group_rows:
+            self._flush()
+
+    def _flush(self):
+        if not self.pending:
+            return
+        df = pd.concat(self.pending, ignore_index=True)
+        df['batch_date'] = pd.to_datetime(df['batch_date']).dt.date
+        self.writer.write_table(self.pa.Table.from_pandas(df, schema=self.schema, preserve_index=False))
+        self.pending, self.pending_rows = [], 0
+
+    def close(self):
+        self._flush()
+        self.writer.close()
+
+
+def open_sink(path):
+    if str(path).endswith('.parquet'):
+        return _ParquetSink(path)
+    return _CsvSink(path)
+
+
+def read_state(path):
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {}
+
+
+def write_state(path, state):
+    # Written only after the export file is complete, and swapped in atomically.
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, path)
+
+
+def _frame(chunk, fund, batches, commitments):
+    b = batches.reindex(chunk.batch_ids)
+    c = commitments.reindex(chunk.commitment_ids)
+    return pd.DataFrame({
+        'ledger_id': chunk.ids,
+        'fund_id': fund['id'],
+        'fund': fund['name'],
+        'batch_id': chunk.batch_ids,
+        'batch_date': chunk.dates,
+        'description': b['description'].to_numpy(),
+        'posted_at': b['posted_at'].to_numpy(),
+        'commitment_id': chunk.commitment_ids,
+        'investor_id': c['investor_id'].to_numpy(),
+        'investor': c['investor'].to_numpy(),
+        'trans_code': chunk.trans_codes,
+        'category': [pcap.CATEGORIES.get(code) for code in chunk.trans_codes],
+        'amount': chunk.amount_cents / 100,
+    }, columns=EXPORT_COLUMNS)
+
+
+def export_ledger(repo, out, fund_ids=None, start=None, end=None, state_path=None, page_size=reader.PAGE_SIZE,
+                  lag_seconds=EXPORT_LAG_SECONDS):
+    # fund_ids: None for every fund. start/end filter on batch_date (inclusive).
+    state = read_state(state_path)
+    # A watermark only covers the funds and dates it was taken over.
+    scope = {'funds': sorted(fund_ids) if fund_ids is not None else None,
+             'start': str(start) if start else None, 'end': str(end) if end else None}
+    if state and state.get('scope') != scope:
+        raise ValueError(f"{state_path} was written for {state.get('scope')}, not {scope}")
+    posted_after = state.get('posted_after')
+    posted_through = repo.server_time(lag_seconds) if state_path else None
+    funds = [f for f in repo.list_funds() if fund_ids is None or f['id'] in fund_ids]
+
+    rows = n_batches = 0
+    sink = open_sink(out)
+    try:
+        for fund in funds:
+            batch_rows = repo.list_posted_batches(fund['id'], start, end, posted_after, posted_through)
+            if not batch_rows:
+                continue
+            batches = pd.DataFrame(batch_rows).set_index('id')
+            commitments = pd.DataFrame([
+                {'id': c['id'], 'investor_id': c['investor_id'], 'investor': (c.get('investors') or {}).get('display_name')}
+                for c in repo.list_commitments(fund['id'])
+            ], columns=['id', 'investor_id', 'investor']).set_index('id')
+
+            ids = batches.index.tolist()
+            for start_at in range(0, len(ids), storage.ID_CHUNK):
+                group = ids[start_at:start_at + storage.ID_CHUNK]
+                for chunk in repo.iter_posted_chunks(fund['id'], batch_ids=group, page_size=page_size):
+                    df = _frame(chunk, fund, batches, commitments)
+                    sink.write(df)
+                    rows += len(df)
+
+            n_batches += len(batches)
+    finally:
+        sink.close()
+
+    if state_path:
+        write_state(state_path, {'scope': scope, 'posted_after': posted_through})
+    return {'rows': rows, 'batches': n_batches, 'posted_after': posted_after, 'posted_through': posted_through}
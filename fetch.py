@@ -0,0 +1,22 @@
+from concurrent.futures import ThreadPoolExecutor
+
+# Concurrent fan-out for independent reads. Queries are I/O bound, so a small
+# shared thread pool lets a screen wait for the slowest call instead of the
+# sum of them. The Supabase client keeps one pooled HTTP connection set that
+# all worker threads reuse.
+#
+# Don't call gather() from inside a gathered call: nested waits on the same
+# bounded pool can deadlock.
+
+MAX_WORKERS = 8
+
+_pool = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='fundlite-fetch')
+
+
+def gather(*calls):
+    # Run zero-argument callables concurrently; results come back in call order
+    # and the first exception is re-raised.
+    if len(calls) == 1:
+        return [calls[0]()]
+    futures = [_pool.submit(call) for call in calls]
+    return [f.result() for f in futures]
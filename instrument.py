@@ -0,0 +1,116 @@
+import functools
+import json
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# Per-rerun instrumentation. A Recorder collects timed events (repository
+# calls and named phases) for one script run; InstrumentedRepository wraps a
+# Repository so every call is counted with its latency, rows and payload size.
+# Events can also be appended to a JSON-lines file for offline analysis.
+# scope tells a full script run ('run') from a fragment-only rerun ('fragment').
+
+_sink_lock = threading.Lock()
+
+
+class Recorder:
+    def __init__(self, sink=None, measure_bytes=True, scope='run'):
+        self.run_id = uuid.uuid4().hex[:12]
+        self.scope = scope
+        self.sink = sink
+        self.measure_bytes = measure_bytes
+        self.started = time.time()
+        self.events = []
+
+    def record(self, kind, name, seconds, rows=None, nbytes=None):
+        event = {
+            'ts': time.time(), 'run_id': self.run_id, 'scope': self.scope, 'kind': kind, 'name': name,
+            'ms': round(seconds * 1000, 3), 'rows': rows, 'bytes': nbytes,
+        }
+        self.events.append(event)
+        if self.sink:
+            with _sink_lock, open(self.sink, 'a') as f:
+                f.write(json.dumps(event) + "\n")
+
+    @contextmanager
+    def phase(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record('phase', name, time.perf_counter() - t0)
+
+    def summary(self):
+        # One row per (kind, name): calls, total/max ms, rows and bytes.
+        out = {}
+        for e in self.events:
+            s = out.setdefault((e['kind'], e['name']), {'kind': e['kind'], 'name': e['name'], 'calls': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'rows': 0, 'bytes': 0})
+            s['calls'] += 1
+            s['total_ms'] += e['ms']
+            s['max_ms'] = max(s['max_ms'], e['ms'])
+            s['rows'] += e['rows'] or 0
+            s['bytes'] += e['bytes'] or 0
+        return sorted(out.values(), key=lambda s: -s['total_ms'])
+
+
+def _payload_size(value):
+    try:
+        return len(json.dumps(value, default=str))
+    except (TypeError, ValueError):
+        return None
+
+
+class InstrumentedRepository:
+    # `recorder` can be swapped between reruns (see app.fragment).
+    def __init__(self, repo, recorder):
+        self._repo = repo
+        self.recorder = recorder
+
+    def __getattr__(self, attr):
+        value = getattr(self._repo, attr)
+        if not callable(value):
+            return value
+
+        name = f"{self._repo.name}.{attr}"
+        if attr.startswith('iter_'):
+            return functools.partial(self._timed_iter, name, value)
+
+        @functools.wraps(value)
+        def timed(*args, **kwargs):
+            t0 = time.perf_counter()
+            result = value(*args, **kwargs)
+            elapsed = time.perf_counter() - t0
+            rows = len(result) if isinstance(result, list) else None
+            nbytes = _payload_size(result) if self.recorder.measure_bytes and isinstance(result, list) else None
+            self.recorder.record('query', name, elapsed, rows, nbytes)
+            return result
+        return timed
+
+    def _timed_iter(self, name, fn, *args, **kwargs):
+        # One event per page, timed from request to chunk.
+        it = iter(fn(*args, **kwargs))
+        while True:
+            t0 = time.perf_counter()
+            try:
+                chunk = next(it)
+            except StopIteration:
+                # The terminating empty page is a round trip too.
+                self.recorder.record('query', name, time.perf_counter() - t0, rows=0)
+                return
+            self.recorder.record('query', name, time.perf_counter() - t0, rows=len(chunk[0]))
+            yield chunk
+
+
+def render_panel(recorder):
+    import streamlit as st
+
+    summary = recorder.summary()
+    queries = [s for s in summary if s['kind'] == 'query']
+    st.subheader("⏱️ This Rerun")
+    c1, c2 = st.columns(2)
+    c1.metric("Queries", sum(s['calls'] for s in queries))
+    c2.metric("Query ms", f"{sum(s['total_ms'] for s in queries):,.1f}")
+    st.caption(f"{sum(s['rows'] for s in queries):,} rows, {sum(s['bytes'] for s in queries) / 1024:,.1f} KiB; {recorder.scope} {recorder.run_id}")
+    if summary:
+        st.dataframe(summary, hide_index=True, use_container_width=True)
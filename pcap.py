@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+
+# Partner capital account math. Totals are aggregated in the database by the
+# pcap_totals view (sql/pcap_totals.sql); keep CATEGORIES in sync with it.
+
+CATEGORIES = {
+    'CC-PRIN': 'contributions',
+    'INC-ORD': 'additions',
+    'GAIN-RL': 'additions',
+    'EXP-GEN': 'deductions',
+    'LOSS-RL': 'deductions',
+    'DIST-ROC': 'distributions',
+    'DIST-GAIN': 'distributions',
+}
+
+TOTAL_FIELDS = ['contributions', 'additions', 'deductions', 'distributions']
+
+# Codes shown in parentheses: they reduce the capital account.
+DEBIT_CODES = [code for code, cat in CATEGORIES.items() if cat in ('deductions', 'distributions')]
+
+
+def parse_totals(row):
+    totals = {f: float(row[f]) for f in TOTAL_FIELDS}
+    totals['entry_count'] = int(row['entry_count'])
+    return totals
+
+
+def fetch_pcap_totals(repo, fund_id, commitment_id):
+    # One small row per commitment; None when nothing has been posted yet.
+    rows = repo.pcap_totals(fund_id, commitment_id)
+    if not rows:
+        return None
+    return parse_totals(rows[0])
+
+
+def capital_account(totals, committed_amount):
+    ending = totals['contributions'] + totals['additions'] - totals['deductions'] - totals['distributions']
+    return {
+        **totals,
+        'net_income': totals['additions'] - totals['deductions'],
+        'ending_balance': ending,
+        'unfunded_balance': float(committed_amount) - totals['contributions'],
+    }
+
+
+def empty_history():
+    return {'date': [], 'trans_code': [], 'amount': []}
+
+
+def _extend_history(hist, chunk, sel=slice(None)):
+    hist['date'].extend(chunk.dates[sel].tolist())
+    hist['trans_code'].extend(chunk.trans_codes[sel].tolist())
+    hist['amount'].extend((chunk.amount_cents[sel] / 100).tolist())
+
+
+def fetch_posted_history(repo, fund_id, commitment_id, as_of=None):
+    # Columns dict (date, trans_code, amount) of POSTED rows, read page by page;
+    # with as_of, only rows dated on or before it.
+    hist = empty_history()
+    for chunk in repo.iter_posted_chunks(fund_id, commitment_id, as_of=as_of):
+        _extend_history(hist, chunk)
+    return hist
+
+
+def fetch_all_pcap_totals(repo, fund_id):
+    # Every commitment's totals in the fund, keyed by commitment_id.
+    return {row['commitment_id']: parse_totals(row) for row in repo.pcap_totals(fund_id)}
+
+
+def fetch_all_posted_history(repo, fund_id, as_of=None):
+    # Posted history for the whole fund, grouped by commitment_id one page at a time.
+    out = {}
+    for chunk in repo.iter_posted_chunks(fund_id, as_of=as_of):
+        order = np.argsort(chunk.commitment_ids, kind='stable')
+        cids, starts = np.unique(chunk.commitment_ids[order], return_index=True)
+        ends = np.append(starts[1:], len(order))
+        for cid, a, b in zip(cids.tolist(), starts, ends):
+            _extend_history(out.setdefault(cid, empty_history()), chunk, order[a:b])
+    return out
+
+
+REPORT_COLUMNS = ['Investor', 'Commitment', 'Contributions', 'Net Income', 'Distributions', 'Ending Capital', 'Unfunded']
+
+
+def fund_report(commitments, totals_rows):
+    # Capital accounts for every commitment at once. totals_rows are the
+    # pcap_totals view rows (one grouped pass over posted entries); commitments
+    # without posted activity show zeros.
+    comm = pd.DataFrame(commitments, columns=['id', 'committed_amount', 'investors'])
+    tot = pd.DataFrame(totals_rows, columns=['commitment_id'] + TOTAL_FIELDS)
+    df = comm.merge(tot, how='left', left_on='id', right_on='commitment_id')
+    df[TOTAL_FIELDS] = df[TOTAL_FIELDS].astype(float).fillna(0.0)
+    committed = df['committed_amount'].astype(float)
+
+    return pd.DataFrame({
+        'Investor': [(i or {}).get('display_name', "Unknown") for i in df['investors']],
+        'Commitment': committed,
+        'Contributions': df['contributions'],
+        'Net Income': df['additions'] - df['deductions'],
+        'Distributions': df['distributions'],
+        'Ending Capital': df['contributions'] + df['additions'] - df['deductions'] - df['distributions'],
+        'Unfunded': committed - df['contributions'],
+    }, columns=REPORT_COLUMNS)
@@ -0,0 +1,78 @@
+from collections import namedtuple
+
+import numpy as np
+
+from allocation import cents_array
+
+# Paged reads. PostgREST silently caps every response (1000 rows on Supabase
+# by default), so anything that can grow with the fund is read in keyset
+# pages ordered by a unique key instead of one .execute().
+
+PAGE_SIZE = 1000
+
+POSTED_COLUMNS = "id, batch_id, commitment_id, trans_code, amount, batches!inner(batch_date)"
+
+LedgerChunk = namedtuple('LedgerChunk', ['ids', 'commitment_ids', 'trans_codes', 'dates', 'amount_cents', 'batch_ids'])
+
+
+def iter_pages(build_query, key='id', page_size=PAGE_SIZE):
+    # build_query() must return a fresh, filtered select that includes `key`.
+    last = None
+    while True:
+        q = build_query()
+        if last is not None:
+            q = q.gt(key, last)
+        rows = q.order(key).limit(page_size).execute().data or []
+        # Stop on an empty page rather than a short one: the server cap may be
+        # lower than page_size, and a short page would look like the end.
+        if not rows:
+            return
+        yield rows
+        last = rows[-1][key]
+
+
+def read_all(build_query, key='id', page_size=PAGE_SIZE):
+    out = []
+    for rows in iter_pages(build_query, key, page_size):
+        out.extend(rows)
+    return out
+
+
+def read_all_rpc(client, fn, params, key, page_size=PAGE_SIZE):
+    # For set-returning functions that page themselves: p_after (last key
+    # seen) and p_limit, with rows ordered by key.
+    out = []
+    last = None
+    while True:
+        rows = client.rpc(fn, {**params, 'p_after': last, 'p_limit': page_size}).execute().data or []
+        if not rows:
+            return out
+        out.extend(rows)
+        last = rows[-1][key]
+
+
+def to_chunk(rows):
+    return LedgerChunk(
+        ids=np.array([r['id'] for r in rows]),
+        commitment_ids=np.array([r['commitment_id'] for r in rows]),
+        trans_codes=np.array([r['trans_code'] for r in rows], dtype=object),
+        dates=np.array([r['batches']['batch_date'] for r in rows], dtype=object),
+        amount_cents=cents_array([r['amount'] for r in rows]),
+        batch_ids=np.array([r['batch_id'] for r in rows]),
+    )
+
+
+def iter_posted_chunks(client, fund_id=None, commitment_id=None, batch_ids=None, as_of=None, page_size=PAGE_SIZE):
+    def build():
+        q = client.table('ledger_entries').select(POSTED_COLUMNS).eq('batches.status', 'POSTED')
+        if fund_id is not None:
+            q = q.eq('fund_id', fund_id)
+        if commitment_id is not None:
+            q = q.eq('commitment_id', commitment_id)
+        if batch_ids is not None:
+            q = q.in_('batch_id', list(batch_ids))
+        if as_of is not None:
+            q = q.lte('batches.batch_date', str(as_of))
+        return q
+    for rows in iter_pages(build, page_size=page_size):
+        yield to_chunk(rows)
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+
+import pcap
+import storage
+
+# Per-commitment balance snapshots at quarter ends (balance_snapshots table).
+# Each snapshot holds cumulative POSTED totals up to its date. Posting a batch
+# adds its deltas to the snapshots from its quarter onwards; deleting a posted
+# batch takes them back out. An as-of query reads the nearest snapshot and
+# adds only the entries posted after it.
+
+
+def period_end(batch_date):
+    return (pd.Timestamp(batch_date) + pd.offsets.QuarterEnd(0)).date().isoformat()
+
+
+def post_batch(repo, batch_id):
+    return bool(post_batches(repo, [batch_id]))
+
+
+def post_batches(repo, batch_ids):
+    # Posts in chunks of storage.ID_CHUNK, each in one database transaction
+    # (Repository.post_batches): only batches still DRAFT are claimed and get
+    # their deltas, so a batch posted concurrently elsewhere is never counted
+    # twice, and a chunk that fails leaves nothing behind. Earlier chunks stay
+    # posted. Returns the posted ids.
+    posted = []
+    for start in range(0, len(batch_ids), storage.ID_CHUNK):
+        posted.extend(repo.post_batches(list(batch_ids[start:start + storage.ID_CHUNK])))
+    return posted
+
+
+def delete_batch(repo, batch_id):
+    # A POSTED batch's deltas come out in the same transaction as the delete.
+    repo.delete_batch(batch_id)
+
+
+def balance_as_of(repo, fund_id, as_of, commitment_id):
+    rows = repo.balances_as_of(fund_id, as_of, commitment_id)
+    return pcap.parse_totals(rows[0]) if rows else None
+
+
+def balances_as_of(repo, fund_id, as_of):
+    return {row['commitment_id']: pcap.parse_totals(row) for row in repo.balances_as_of(fund_id, as_of)}
+
+
+def rebuild(repo, fund_id):
+    # Recompute every snapshot from the posted ledger, one page at a time
+    # (for backfill, or after edits made outside the app).
+    categories = pcap.TOTAL_FIELDS
+    code_index = {code: categories.index(cat) for code, cat in pcap.CATEGORIES.items()}
+    acc = None
+    for chunk in repo.iter_posted_chunks(fund_id):
+        cat = np.array([code_index.get(c, -1) for c in chunk.trans_codes])
+        part = pd.DataFrame({
+            'commitment_id': chunk.commitment_ids,
+            'as_of_date': [period_end(d) for d in chunk.dates],
+        })
+        for i, name in enumerate(categories):
+            part[name] = np.where(cat == i, chunk.amount_cents, 0)
+        part['entry_count'] = 1
+        part = part.groupby(['commitment_id', 'as_of_date']).sum()
+        acc = part if acc is None else acc.add(part, fill_value=0)
+
+    if acc is None:
+        repo.replace_snapshots(fund_id, [])
+        return 0
+    cum = acc.sort_index().groupby(level='commitment_id').cumsum().reset_index()
+    for name in categories:
+        cum[name] = cum[name] / 100
+    cum['entry_count'] = cum['entry_count'].astype(int)
+    cum.insert(0, 'fund_id', fund_id)
+    rows = cum.to_dict('records')
+    repo.replace_snapshots(fund_id, rows)
+    return len(rows)
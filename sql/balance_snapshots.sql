@@ -0,0 +1,38 @@
+-- Cumulative per-commitment totals at period ends (see snapshots.py), plus
+-- the per-batch category deltas used to maintain them. Portable to SQLite.
+--
+-- Snapshots are maintained incrementally from here on, so on a database that
+-- already has POSTED batches they must be seeded before anything else is
+-- posted (and again after sql/multi_fund.sql), or as-of balances will ignore
+-- all earlier history:
+--
+--   python cli.py snapshots rebuild            # every fund
+--   python cli.py snapshots rebuild --fund 1
+
+create table if not exists balance_snapshots (
+    fund_id bigint not null references funds (id),
+    commitment_id bigint not null references commitments (id),
+    as_of_date date not null,
+    contributions numeric not null default 0,
+    additions numeric not null default 0,
+    deductions numeric not null default 0,
+    distributions numeric not null default 0,
+    entry_count bigint not null default 0,
+    primary key (commitment_id, as_of_date)
+);
+
+create index if not exists batches_batch_date_idx on batches (batch_date);
+create index if not exists balance_snapshots_fund_date_idx on balance_snapshots (fund_id, as_of_date);
+
+create view batch_category_totals as
+select
+    le.fund_id,
+    le.batch_id,
+    le.commitment_id,
+    coalesce(sum(case when le.trans_code = 'CC-PRIN' then le.amount else 0 end), 0) as contributions,
+    coalesce(sum(case when le.trans_code in ('INC-ORD', 'GAIN-RL') then le.amount else 0 end), 0) as additions,
+    coalesce(sum(case when le.trans_code in ('EXP-GEN', 'LOSS-RL') then le.amount else 0 end), 0) as deductions,
+    coalesce(sum(case when le.trans_code in ('DIST-ROC', 'DIST-GAIN') then le.amount else 0 end), 0) as distributions,
+    count(*) as entry_count
+from ledger_entries le
+group by le.fund_id, le.batch_id, le.commitment_id;
@@ -0,0 +1,8 @@
+-- Idempotency keys used by writer.save_batch. Retried or re-run saves find
+-- the existing batch by idempotency_key and upsert entries on entry_key.
+
+alter table batches add column if not exists idempotency_key text;
+create unique index if not exists batches_idempotency_key_idx on batches (idempotency_key);
+
+alter table ledger_entries add column if not exists entry_key text;
+create unique index if not exists ledger_entries_entry_key_idx on ledger_entries (entry_key);
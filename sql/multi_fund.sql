@@ -0,0 +1,32 @@
+-- Multi-fund migration. Adds funds and a fund_id on every fund-scoped table,
+-- assigning existing rows to the original fund. Run before pcap_totals.sql,
+-- balance_snapshots.sql and snapshot_functions.sql, which are re-created
+-- here with their fund-keyed definitions.
+
+create table if not exists funds (
+    id bigint generated by default as identity primary key,
+    name text not null unique
+);
+insert into funds (name) values ('Harbor View Fund I') on conflict (name) do nothing;
+
+alter table commitments add column if not exists fund_id bigint references funds (id);
+update commitments set fund_id = (select id from funds where name = 'Harbor View Fund I') where fund_id is null;
+alter table commitments alter column fund_id set not null;
+
+alter table batches add column if not exists fund_id bigint references funds (id);
+update batches set fund_id = (select id from funds where name = 'Harbor View Fund I') where fund_id is null;
+alter table batches alter column fund_id set not null;
+
+-- Denormalised from the batch so ledger reads filter on one indexed column.
+alter table ledger_entries add column if not exists fund_id bigint references funds (id);
+update ledger_entries le set fund_id = b.fund_id from batches b where b.id = le.batch_id and le.fund_id is null;
+alter table ledger_entries alter column fund_id set not null;
+
+alter table if exists balance_snapshots add column if not exists fund_id bigint references funds (id);
+update balance_snapshots s set fund_id = c.fund_id from commitments c where c.id = s.commitment_id and s.fund_id is null;
+
+drop index if exists ledger_entries_commitment_id_idx;
+drop index if exists batches_status_idx;
+drop function if exists balances_as_of(date, bigint);
+drop view if exists pcap_totals;
+drop view if exists batch_category_totals;
@@ -0,0 +1,26 @@
+-- Per-commitment capital account totals over POSTED batches only, keyed by
+-- fund so every read is served by the (fund_id, ...) indexes.
+-- Category membership must stay in sync with pcap.CATEGORIES.
+-- Plain CASE sums (no FILTER clause) so the view also loads in SQLite.
+
+create index if not exists ledger_entries_fund_commitment_idx on ledger_entries (fund_id, commitment_id);
+-- Keyset pages over a fund's ledger (reader.iter_posted_chunks) walk this in
+-- id order; without it every page sorts the whole fund.
+create index if not exists ledger_entries_fund_id_idx on ledger_entries (fund_id, id);
+create index if not exists ledger_entries_batch_id_idx on ledger_entries (batch_id);
+create index if not exists batches_fund_status_idx on batches (fund_id, status);
+create index if not exists commitments_fund_id_idx on commitments (fund_id);
+
+create view pcap_totals as
+select
+    le.fund_id,
+    le.commitment_id,
+    coalesce(sum(case when le.trans_code = 'CC-PRIN' then le.amount else 0 end), 0) as contributions,
+    coalesce(sum(case when le.trans_code in ('INC-ORD', 'GAIN-RL') then le.amount else 0 end), 0) as additions,
+    coalesce(sum(case when le.trans_code in ('EXP-GEN', 'LOSS-RL') then le.amount else 0 end), 0) as deductions,
+    coalesce(sum(case when le.trans_code in ('DIST-ROC', 'DIST-GAIN') then le.amount else 0 end), 0) as distributions,
+    count(*) as entry_count
+from ledger_entries le
+join batches b on b.id = le.batch_id
+where b.status = 'POSTED'
+group by le.fund_id, le.commitment_id;
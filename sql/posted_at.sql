@@ -0,0 +1,28 @@
+-- posted_at on batches, stamped by trigger whenever a batch becomes POSTED.
+-- export.py uses it as the watermark for incremental ledger exports, since
+-- posting a draft changes its batch, not its entry ids.
+
+alter table batches add column if not exists posted_at timestamptz;
+update batches set posted_at = now() where status = 'POSTED' and posted_at is null;
+create index if not exists batches_posted_at_idx on batches (posted_at);
+
+create or replace function set_batch_posted_at() returns trigger
+language plpgsql as $$
+begin
+    if new.status = 'POSTED' and (tg_op = 'INSERT' or old.status is distinct from 'POSTED') then
+        new.posted_at := now();
+    end if;
+    return new;
+end;
+$$;
+
+-- The export's upper bound comes from the database clock, not the client's.
+create or replace function server_now(p_lag_seconds integer default 0) returns timestamptz
+language sql stable as $$
+    select now() - make_interval(secs => p_lag_seconds);
+$$;
+
+drop trigger if exists batches_posted_at on batches;
+create trigger batches_posted_at
+before insert or update of status on batches
+for each row execute function set_batch_posted_at();
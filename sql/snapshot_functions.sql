@@ -0,0 +1,184 @@
+-- Postgres RPCs behind SupabaseRepository's snapshot methods.
+-- SQLiteRepository runs the same statements inline.
+--
+-- Posting and deleting a batch each run as one function call, so the status
+-- change, the snapshot deltas and the delete commit or roll back together.
+-- Both take a per-fund advisory lock first: concurrent writers to one fund's
+-- snapshots queue up instead of racing to seed the same quarter row.
+
+-- Held until the calling transaction ends. The first key namespaces the lock
+-- to this table so it can't collide with other advisory lock users.
+create or replace function lock_fund_snapshots(p_fund_id bigint)
+returns void
+language sql as $$
+    select pg_advisory_xact_lock('balance_snapshots'::regclass::oid::integer, p_fund_id::integer);
+$$;
+
+create or replace function quarter_end(p_date date)
+returns date
+language sql immutable as $$
+    select (date_trunc('quarter', p_date) + interval '3 months - 1 day')::date;
+$$;
+
+-- Add (p_sign = 1) or remove (p_sign = -1) one batch's deltas: seed a snapshot
+-- at p_period_end from the previous one where missing, then shift every
+-- snapshot from p_period_end onwards. Only called from post_batches and
+-- delete_batch, with the fund's lock held.
+create or replace function apply_batch_snapshots(p_batch_id bigint, p_period_end date, p_sign integer)
+returns void
+language plpgsql as $$
+begin
+    insert into balance_snapshots (fund_id, commitment_id, as_of_date, contributions, additions, deductions, distributions, entry_count)
+    select
+        d.fund_id, d.commitment_id, p_period_end,
+        coalesce(p.contributions, 0), coalesce(p.additions, 0), coalesce(p.deductions, 0),
+        coalesce(p.distributions, 0), coalesce(p.entry_count, 0)
+    from batch_category_totals d
+    left join balance_snapshots p
+        on p.commitment_id = d.commitment_id
+        and p.as_of_date = (
+            select max(p2.as_of_date) from balance_snapshots p2
+            where p2.commitment_id = d.commitment_id and p2.as_of_date < p_period_end
+        )
+    where d.batch_id = p_batch_id
+    on conflict (commitment_id, as_of_date) do nothing;
+
+    update balance_snapshots s set
+        contributions = s.contributions + p_sign * d.contributions,
+        additions = s.additions + p_sign * d.additions,
+        deductions = s.deductions + p_sign * d.deductions,
+        distributions = s.distributions + p_sign * d.distributions,
+        entry_count = s.entry_count + p_sign * d.entry_count
+    from batch_category_totals d
+    where d.batch_id = p_batch_id
+      and s.commitment_id = d.commitment_id
+      and s.as_of_date >= p_period_end;
+end;
+$$;
+
+-- Claim the batches among p_batch_ids that are still DRAFT and apply their
+-- deltas, all in the caller's transaction. A batch posted concurrently is
+-- skipped by the status filter once its row lock is released. Returns the
+-- ids posted by this call.
+create or replace function post_batches(p_batch_ids bigint[])
+returns setof bigint
+language plpgsql as $$
+declare
+    f bigint;
+    b record;
+begin
+    -- In fund order, so two multi-fund calls can't deadlock.
+    for f in select distinct fund_id from batches where id = any(p_batch_ids) order by fund_id loop
+        perform lock_fund_snapshots(f);
+    end loop;
+    for b in
+        update batches set status = 'POSTED'
+        where id = any(p_batch_ids) and status = 'DRAFT'
+        returning id, batch_date
+    loop
+        perform apply_batch_snapshots(b.id, quarter_end(b.batch_date), 1);
+        return next b.id;
+    end loop;
+end;
+$$;
+
+-- Delete a batch and its entries, taking a POSTED batch's deltas back out of
+-- the snapshots first.
+create or replace function delete_batch(p_batch_id bigint)
+returns void
+language plpgsql as $$
+declare
+    b batches%rowtype;
+begin
+    select * into b from batches where id = p_batch_id;
+    if not found then
+        return;
+    end if;
+    perform lock_fund_snapshots(b.fund_id);
+    -- Re-read under the lock: the status may have changed while we waited.
+    select * into b from batches where id = p_batch_id for update;
+    if not found then
+        return;
+    end if;
+    if b.status = 'POSTED' then
+        perform apply_batch_snapshots(b.id, quarter_end(b.batch_date), -1);
+    end if;
+    delete from ledger_entries where batch_id = p_batch_id;
+    delete from batches where id = p_batch_id;
+end;
+$$;
+
+-- For each commitment: the latest snapshot on or before p_as_of, plus posted
+-- entries dated after that snapshot up to p_as_of. Pages by commitment_id
+-- (p_after, p_limit) inside the function: the page's commitments are picked
+-- first and only they are aggregated, where paging the RPC's output from
+-- outside would re-run the whole fund for every page. Every commitment in the
+-- page gets a row, all null when it has no balance, so a page is only empty
+-- past the last commitment.
+
+drop function if exists balances_as_of(bigint, date, bigint);
+
+create or replace function balances_as_of(
+    p_fund_id bigint,
+    p_as_of date,
+    p_commitment_id bigint default null,
+    p_after bigint default null,
+    p_limit integer default null
+)
+returns table (
+    commitment_id bigint,
+    contributions numeric,
+    additions numeric,
+    deductions numeric,
+    distributions numeric,
+    entry_count bigint
+)
+language sql stable as $$
+    with page as (
+        select c.id
+        from commitments c
+        where c.fund_id = p_fund_id
+          and (p_commitment_id is null or c.id = p_commitment_id)
+          and (p_after is null or c.id > p_after)
+        order by c.id
+        limit p_limit
+    ),
+    snap as (
+        select s.*
+        from balance_snapshots s
+        where s.commitment_id in (select id from page)
+        and s.as_of_date = (
+            select max(s2.as_of_date) from balance_snapshots s2
+            where s2.commitment_id = s.commitment_id and s2.as_of_date <= p_as_of
+        )
+    ),
+    tail as (
+        select
+            le.commitment_id,
+            sum(case when le.trans_code = 'CC-PRIN' then le.amount else 0 end) as contributions,
+            sum(case when le.trans_code in ('INC-ORD', 'GAIN-RL') then le.amount else 0 end) as additions,
+            sum(case when le.trans_code in ('EXP-GEN', 'LOSS-RL') then le.amount else 0 end) as deductions,
+            sum(case when le.trans_code in ('DIST-ROC', 'DIST-GAIN') then le.amount else 0 end) as distributions,
+            count(*) as entry_count
+        from ledger_entries le
+        join batches b on b.id = le.batch_id
+        left join snap on snap.commitment_id = le.commitment_id
+        where le.commitment_id in (select id from page)
+          and b.status = 'POSTED'
+          and b.batch_date <= p_as_of
+          and (snap.as_of_date is null or b.batch_date > snap.as_of_date)
+        group by le.commitment_id
+    )
+    select
+        page.id,
+        sum(u.contributions), sum(u.additions), sum(u.deductions), sum(u.distributions),
+        sum(u.entry_count)::bigint
+    from page
+    left join (
+        select commitment_id, contributions, additions, deductions, distributions, entry_count from snap
+        union all
+        select commitment_id, contributions, additions, deductions, distributions, entry_count from tail
+    ) u on u.commitment_id = page.id
+    group by page.id
+    order by page.id;
+$$;
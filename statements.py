@@ -0,0 +1,222 @@
+import io
+import os
+import re
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+
+from fpdf import FPDF
+from fpdf.enums import XPos, YPos
+
+import fetch
+import pcap
+import snapshots
+
+
+def fmt(val):
+    return f"${val:,.2f}"
+
+# --- Statement renderer ---
+# Takes plain column sequences, paginates the transaction table with a
+# repeated header row, and writes straight to bytes, a path or a file object.
+
+DESCRIPTIONS = {'contributions': "Capital Call", 'distributions': "Distribution"}
+
+
+# fpdf2 cell() keywords for "move to the start of the next line".
+NEXT_LINE = {'new_x': XPos.LMARGIN, 'new_y': YPos.NEXT}
+
+
+class StatementRenderer:
+    FONT = "Helvetica"
+    # Explicit: set_auto_page_break(False) would otherwise reset it to 0.
+    BOTTOM_MARGIN = 15
+    COLUMNS = [("Date", 30, 'L'), ("Type", 40, 'L'), ("Description", 80, 'L'), ("Amount", 40, 'R')]
+
+    def __init__(self, row_height=10, font_path=None):
+        # Helvetica only covers Latin-1; font_path names a TTF covering the
+        # scripts in investor and fund names (DejaVuSans.ttf for Greek and
+        # Cyrillic, a Noto CJK font for Chinese). The one file serves every style.
+        self.row_height = row_height
+        self.font_path = font_path
+        self.font = "Statement" if font_path else self.FONT
+        self.table_width = sum(w for _, w, _ in self.COLUMNS)
+        # Computed once and reused for every document this renderer produces.
+        self.descriptions = {code: DESCRIPTIONS.get(cat, "P&L Allocation") for code, cat in pcap.CATEGORIES.items()}
+
+    def _table_header(self, pdf):
+        pdf.set_font(self.font, "B", 10)
+        for i, (label, width, align) in enumerate(self.COLUMNS):
+            last = i == len(self.COLUMNS) - 1
+            pdf.cell(width, self.row_height, label, border=1, align=align, **(NEXT_LINE if last else {}))
+        pdf.set_font(self.font, "", 10)
+
+    def _new_page(self, pdf, fund_name, investor_name):
+        pdf.add_page()
+        pdf.set_font(self.font, "I", 9)
+        pdf.cell(self.table_width, 6, text=f"{fund_name} - {investor_name} (continued)", **NEXT_LINE)
+        self._table_header(pdf)
+
+    def render(self, investor_name, fund_name, balance, unfunded, dates, codes, amounts, out=None, as_of=None):
+        pdf = FPDF()
+        if self.font_path:
+            for style in ("", "B", "I"):
+                pdf.add_font(self.font, style, self.font_path)
+        pdf.set_auto_page_break(False, margin=self.BOTTOM_MARGIN)
+        pdf.add_page()
+
+        # Header
+        pdf.set_font(self.font, "B", 16)
+        pdf.cell(190, 10, text=fund_name, align='C', **NEXT_LINE)
+        pdf.set_font(self.font, "I", 10)
+        pdf.cell(190, 10, text="Partner Capital Account Statement", align='C', **NEXT_LINE)
+        pdf.line(10, 30, 200, 30)
+
+        # Info
+        pdf.ln(10)
+        pdf.set_font(self.font, "B", 12)
+        pdf.cell(0, 10, text=f"Investor: {investor_name}", **NEXT_LINE)
+        pdf.cell(0, 10, text=f"Date: {as_of or date.today()}", **NEXT_LINE)
+
+        # Summary Box
+        pdf.ln(5)
+        pdf.set_fill_color(240, 240, 240)
+        pdf.cell(0, 10, text=f"Ending Capital Balance: {fmt(balance)}", fill=True, **NEXT_LINE)
+        pdf.cell(0, 10, text=f"Remaining Unfunded Commitment: {fmt(unfunded)}", fill=True, **NEXT_LINE)
+
+        # Table
+        pdf.ln(10)
+        self._table_header(pdf)
+        w_date, w_type, w_desc, w_amt = (w for _, w, _ in self.COLUMNS)
+        h = self.row_height
+        bottom = pdf.h - self.BOTTOM_MARGIN
+        for d, code, amt in zip(dates, codes, amounts):
+            if pdf.get_y() + h > bottom:
+                self._new_page(pdf, fund_name, investor_name)
+            pdf.cell(w_date, h, str(d), border=1)
+            pdf.cell(w_type, h, code, border=1)
+            pdf.cell(w_desc, h, self.descriptions.get(code, "P&L Allocation"), border=1)
+            pdf.cell(w_amt, h, fmt(amt), border=1, align='R', **NEXT_LINE)
+
+        return _write_pdf(pdf, out)
+
+
+def _write_pdf(pdf, out):
+    # fpdf2 renders to a bytearray; paths and file objects get it as-is.
+    if isinstance(out, (str, os.PathLike)):
+        pdf.output(os.fspath(out))
+        return out
+    data = pdf.output()
+    if out is None:
+        return bytes(data)
+    out.write(data)
+    return out
+
+
+renderer = StatementRenderer(font_path=os.environ.get('FUNDLITE_PDF_FONT'))
+
+
+def create_pdf(investor_name, fund_name, balance, unfunded, transactions, as_of=None):
+    # DataFrame entry point kept for the single-investor download.
+    return renderer.render(
+        investor_name, fund_name, balance, unfunded,
+        transactions['date'].astype(str).tolist(),
+        transactions['trans_code'].astype(str).tolist(),
+        transactions['amount'].astype(float).tolist(),
+        as_of=as_of,
+    )
+
+
+# --- Bulk statement run ---
+# Balances for the whole fund come from two queries; rendering is CPU-bound
+# FPDF work, so it is spread over a process pool.
+
+def safe_name(name):
+    return re.sub(r'[^A-Za-z0-9._-]+', '_', name).strip('_') or 'investor'
+
+
+def build_statement_jobs(commitments, totals_by_commitment, history_by_commitment, fund_name, as_of=None):
+    # commitments: rows with 'id', 'committed_amount' and the investors(display_name) join.
+    jobs = []
+    for c in commitments:
+        totals = totals_by_commitment.get(c['id'])
+        if not totals:
+            continue
+        acct = pcap.capital_account(totals, c['committed_amount'])
+        name = (c.get('investors') or {}).get('display_name', 'Unknown')
+        hist = history_by_commitment.get(c['id']) or pcap.empty_history()
+        jobs.append({
+            'filename': f"{safe_name(name)}_{c['id']}.pdf",
+            'investor_name': name,
+            'fund_name': fund_name,
+            'balance': acct['ending_balance'],
+            'unfunded': acct['unfunded_balance'],
+            'dates': hist['date'],
+            'codes': hist['trans_code'],
+            'amounts': hist['amount'],
+            'as_of': as_of,
+        })
+    return jobs
+
+
+def _render_job(job):
+    # A statement that can't be rendered (e.g. a name the font can't encode)
+    # comes back as an error message instead of aborting the whole run.
+    try:
+        pdf_bytes = renderer.render(
+            job['investor_name'], job['fund_name'], job['balance'], job['unfunded'],
+            job['dates'], job['codes'], job['amounts'], as_of=job['as_of'],
+        )
+    except Exception as e:
+        return job['filename'], None, f"{type(e).__name__}: {e}"
+    return job['filename'], pdf_bytes, None
+
+
+def render_statements(jobs, out, workers=None, progress=None):
+    # out: a .zip path, a directory path, or a writable binary file object (zipped).
+    # progress(done, total) is called as each statement finishes. Returns the
+    # statements that failed, as (filename, error) pairs; the rest are written.
+    to_dir = isinstance(out, (str, os.PathLike)) and not str(out).endswith('.zip')
+    if to_dir:
+        os.makedirs(out, exist_ok=True)
+        archive = None
+    else:
+        archive = zipfile.ZipFile(out, 'w', compression=zipfile.ZIP_DEFLATED)
+
+    total = len(jobs)
+    failed = []
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_render_job, job) for job in jobs]
+            for done, fut in enumerate(as_completed(futures), start=1):
+                filename, pdf_bytes, error = fut.result()
+                if error is not None:
+                    failed.append((filename, error))
+                elif archive is not None:
+                    archive.writestr(filename, pdf_bytes)
+                else:
+                    with open(os.path.join(out, filename), 'wb') as f:
+                        f.write(pdf_bytes)
+                if progress:
+                    progress(done, total)
+    finally:
+        if archive is not None:
+            archive.close()
+    return sorted(failed)
+
+
+def run_fund_statements(repo, fund_id, commitments, fund_name, out=None, workers=None, progress=None, as_of=None):
+    # as_of: statements as at a past date (e.g. a quarter end), with balances
+    # from the nearest snapshot and history up to that date. Returns (ZIP
+    # bytes or out, failed statements as in render_statements).
+    totals, history = fetch.gather(
+        lambda: pcap.fetch_all_pcap_totals(repo, fund_id) if as_of is None
+        else snapshots.balances_as_of(repo, fund_id, as_of),
+        lambda: pcap.fetch_all_posted_history(repo, fund_id, as_of),
+    )
+    jobs = build_statement_jobs(commitments, totals, history, fund_name, as_of)
+    if out is None:
+        buf = io.BytesIO()
+        failed = render_statements(jobs, buf, workers=workers, progress=progress)
+        return buf.getvalue(), failed
+    return out, render_statements(jobs, out, workers=workers, progress=progress)
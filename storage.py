@@ -0,0 +1,561 @@
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+import reader
+from allocation import cents_array
+
+# Storage backends. Everything outside this module talks to a Repository;
+# SupabaseRepository is the hosted database, SQLiteRepository an embedded
+# file (or :memory:) database for local analytics, tests and offline use.
+
+SQL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sql')
+
+# Ids per filtered request (keeps `id=in.(...)` well under URL length limits).
+ID_CHUNK = 200
+
+# Draft batch types, told apart by description: (must match, must not match).
+BATCH_KINDS = {
+    "call": (['%Call%'], []),
+    "pl": ([], ['%Call%', '%Dist%']),
+    "dist": (['%Dist%'], []),
+}
+
+
+class Repository(ABC):
+    name = "base"
+
+    # Reads of fund data take the fund_id first; batch-level calls are keyed
+    # by the (globally unique) batch id.
+
+    @abstractmethod
+    def list_funds(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def list_commitments(self, fund_id):
+        # Rows with id, investor_id, committed_amount and investors: {display_name}.
+        raise NotImplementedError
+
+    @abstractmethod
+    def list_investors(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def list_draft_batches(self, fund_id, kind):
+        raise NotImplementedError
+
+    @abstractmethod
+    def batch_entries(self, batch_id):
+        # Flat rows: Investor, trans_code, amount.
+        raise NotImplementedError
+
+    @abstractmethod
+    def pcap_totals(self, fund_id, commitment_id=None):
+        # pcap_totals view rows, for one commitment or the whole fund.
+        raise NotImplementedError
+
+    @abstractmethod
+    def iter_posted_chunks(self, fund_id=None, commitment_id=None, batch_ids=None, as_of=None, page_size=reader.PAGE_SIZE):
+        # LedgerChunks of POSTED entries in id order, optionally only those
+        # with batch_date on or before as_of. Keep batch_ids lists to ID_CHUNK.
+        raise NotImplementedError
+
+    @abstractmethod
+    def list_posted_batches(self, fund_id=None, start=None, end=None, posted_after=None, posted_through=None):
+        # POSTED batches, optionally by batch_date range and posted_at window
+        # (posted_after, posted_through].
+        raise NotImplementedError
+
+    @abstractmethod
+    def server_time(self, lag_seconds=0):
+        # The database clock minus lag_seconds, comparable with posted_at.
+        raise NotImplementedError
+
+    @abstractmethod
+    def find_batch(self, idempotency_key):
+        raise NotImplementedError
+
+    @abstractmethod
+    def insert_batch(self, batch_data):
+        raise NotImplementedError
+
+    @abstractmethod
+    def upsert_entries(self, entries):
+        # Insert, ignoring rows whose entry_key already exists.
+        raise NotImplementedError
+
+    @abstractmethod
+    def set_batch_status(self, batch_id, status):
+        # Not for POSTED: that goes through post_batches.
+        raise NotImplementedError
+
+    @abstractmethod
+    def post_batches(self, batch_ids):
+        # In one transaction: claim the batches still DRAFT as POSTED and add
+        # their deltas to balance_snapshots. Returns the ids posted. Keep
+        # batch_ids to ID_CHUNK.
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_batch(self, batch_id):
+        # In one transaction: take a POSTED batch's deltas back out of
+        # balance_snapshots, then delete it and its entries.
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_batch(self, batch_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def balances_as_of(self, fund_id, as_of, commitment_id=None):
+        # pcap_totals-shaped rows as of a date: nearest snapshot + newer posted entries.
+        raise NotImplementedError
+
+    @abstractmethod
+    def replace_snapshots(self, fund_id, rows):
+        raise NotImplementedError
+
+
+class SupabaseRepository(Repository):
+    name = "supabase"
+
+    def __init__(self, client):
+        self.client = client
+
+    def list_funds(self):
+        return reader.read_all(lambda: self.client.table('funds').select("*"))
+
+    def list_commitments(self, fund_id):
+        return reader.read_all(lambda: self.client.table('commitments').select("*, investors(display_name)").eq('fund_id', fund_id))
+
+    def list_investors(self):
+        return reader.read_all(lambda: self.client.table('investors').select("*"))
+
+    def list_draft_batches(self, fund_id, kind):
+        include, exclude = BATCH_KINDS[kind]
+
+        def build():
+            q = self.client.table('batches').select("*").eq('fund_id', fund_id).eq('status', 'DRAFT')
+            for pattern in include:
+                q = q.ilike('description', pattern)
+            for pattern in exclude:
+                q = q.not_.ilike('description', pattern)
+            return q
+        return reader.read_all(build)
+
+    def batch_entries(self, batch_id):
+        build = lambda: self.client.table('ledger_entries').select("id, trans_code, amount, commitments(investors(display_name))").eq('batch_id', batch_id)
+        return [
+            {'Investor': r['commitments']['investors']['display_name'], 'trans_code': r['trans_code'], 'amount': float(r['amount'])}
+            for r in reader.read_all(build)
+        ]
+
+    def pcap_totals(self, fund_id, commitment_id=None):
+        build = lambda: self.client.table('pcap_totals').select("*").eq('fund_id', fund_id)
+        if commitment_id is not None:
+            return build().eq('commitment_id', commitment_id).execute().data or []
+        return reader.read_all(build, key='commitment_id')
+
+    def iter_posted_chunks(self, fund_id=None, commitment_id=None, batch_ids=None, as_of=None, page_size=reader.PAGE_SIZE):
+        return reader.iter_posted_chunks(self.client, fund_id, commitment_id, batch_ids, as_of, page_size)
+
+    def list_posted_batches(self, fund_id=None, start=None, end=None, posted_after=None, posted_through=None):
+        def build():
+            q = self.client.table('batches').select("id, fund_id, batch_date, description, posted_at").eq('status', 'POSTED')
+            if fund_id is not None:
+                q = q.eq('fund_id', fund_id)
+            if start is not None:
+                q = q.gte('batch_date', str(start))
+            if end is not None:
+                q = q.lte('batch_date', str(end))
+            if posted_after is not None:
+                q = q.gt('posted_at', posted_after)
+            if posted_through is not None:
+                q = q.lte('posted_at', posted_through)
+            return q
+        return reader.read_all(build)
+
+    def server_time(self, lag_seconds=0):
+        return self.client.rpc('server_now', {'p_lag_seconds': lag_seconds}).execute().data
+
+    def find_batch(self, idempotency_key):
+        res = self.client.table('batches').select("id").eq('idempotency_key', idempotency_key).execute()
+        return res.data[0]['id'] if res.data else None
+
+    def insert_batch(self, batch_data):
+        return self.client.table('batches').insert(batch_data).execute().data[0]['id']
+
+    def upsert_entries(self, entries):
+        self.client.table('ledger_entries').upsert(entries, on_conflict='entry_key', ignore_duplicates=True).execute()
+
+    def set_batch_status(self, batch_id, status):
+        self.client.table('batches').update({"status": status}).eq('id', batch_id).execute()
+
+    def post_batches(self, batch_ids):
+        # sql/snapshot_functions.sql; one RPC is one transaction.
+        return self.client.rpc('post_batches', {'p_batch_ids': list(batch_ids)}).execute().data or []
+
+    def delete_batch(self, batch_id):
+        self.client.rpc('delete_batch', {'p_batch_id': batch_id}).execute()
+
+    def get_batch(self, batch_id):
+        res = self.client.table('batches').select("*").eq('id', batch_id).execute()
+        return res.data[0] if res.data else None
+
+    def balances_as_of(self, fund_id, as_of, commitment_id=None):
+        params = {'p_fund_id': fund_id, 'p_as_of': str(as_of), 'p_commitment_id': commitment_id}
+        rows = reader.read_all_rpc(self.client, 'balances_as_of', params, key='commitment_id')
+        # Commitments with nothing posted by as_of come back all null.
+        return [r for r in rows if r['entry_count'] is not None]
+
+    def replace_snapshots(self, fund_id, rows, chunk_size=500):
+        self.client.table('balance_snapshots').delete().eq('fund_id', fund_id).execute()
+        for start in range(0, len(rows), chunk_size):
+            self.client.table('balance_snapshots').insert(rows[start:start + chunk_size]).execute()
+
+
+SQLITE_SCHEMA = """
+create table if not exists funds (
+    id integer primary key,
+    name text not null unique
+);
+create table if not exists investors (
+    id integer primary key,
+    display_name text not null
+);
+create table if not exists commitments (
+    id integer primary key,
+    fund_id integer not null references funds (id),
+    investor_id integer not null references investors (id),
+    committed_amount numeric not null
+);
+create table if not exists batches (
+    id integer primary key,
+    fund_id integer not null references funds (id),
+    batch_date text not null,
+    description text,
+    status text not null,
+    idempotency_key text unique,
+    posted_at text
+);
+create table if not exists ledger_entries (
+    id integer primary key,
+    fund_id integer not null references funds (id),
+    batch_id integer not null references batches (id),
+    commitment_id integer not null references commitments (id),
+    trans_code text not null,
+    amount numeric not null,
+    entry_key text unique
+);
+create index if not exists commitments_investor_id_idx on commitments (investor_id);
+create index if not exists batches_posted_at_idx on batches (posted_at);
+-- Also in sql/pcap_totals.sql; repeated here so existing local files get it.
+create index if not exists ledger_entries_fund_id_idx on ledger_entries (fund_id, id);
+-- Stamp posted_at whenever a batch becomes POSTED (sql/posted_at.sql).
+create trigger if not exists batches_posted_at_insert after insert on batches
+when new.status = 'POSTED' and new.posted_at is null
+begin
+    update batches set posted_at = strftime('%Y-%m-%d %H:%M:%f', 'now') where id = new.id;
+end;
+create trigger if not exists batches_posted_at_update after update of status on batches
+when new.status = 'POSTED' and old.status <> 'POSTED'
+begin
+    update batches set posted_at = strftime('%Y-%m-%d %H:%M:%f', 'now') where id = new.id;
+end;
+"""
+
+
+# Snapshot statements mirroring sql/snapshot_functions.sql.
+SQLITE_APPLY_SNAPSHOTS = [
+    """
+    insert into balance_snapshots (fund_id, commitment_id, as_of_date, contributions, additions, deductions, distributions, entry_count)
+    select
+        d.fund_id, d.commitment_id, :period_end,
+        coalesce(p.contributions, 0), coalesce(p.additions, 0), coalesce(p.deductions, 0),
+        coalesce(p.distributions, 0), coalesce(p.entry_count, 0)
+    from batch_category_totals d
+    left join balance_snapshots p
+        on p.commitment_id = d.commitment_id
+        and p.as_of_date = (
+            select max(p2.as_of_date) from balance_snapshots p2
+            where p2.commitment_id = d.commitment_id and p2.as_of_date < :period_end
+        )
+    where d.batch_id = :batch_id
+    on conflict (commitment_id, as_of_date) do nothing
+    """,
+    """
+    update balance_snapshots set
+        contributions = balance_snapshots.contributions + :sign * d.contributions,
+        additions = balance_snapshots.additions + :sign * d.additions,
+        deductions = balance_snapshots.deductions + :sign * d.deductions,
+        distributions = balance_snapshots.distributions + :sign * d.distributions,
+        entry_count = balance_snapshots.entry_count + :sign * d.entry_count
+    from batch_category_totals d
+    where d.batch_id = :batch_id
+      and balance_snapshots.commitment_id = d.commitment_id
+      and balance_snapshots.as_of_date >= :period_end
+    """,
+]
+
+# quarter_end(batch_date) from sql/snapshot_functions.sql.
+SQLITE_QUARTER_END = (
+    "date(batch_date, 'start of month', "
+    "'+' || (3 - (cast(strftime('%m', batch_date) as integer) - 1) % 3) || ' months', '-1 day')"
+)
+
+SQLITE_BALANCES_AS_OF = """
+with snap as (
+    select s.*
+    from balance_snapshots s
+    where s.fund_id = :fund_id
+    and s.as_of_date = (
+        select max(s2.as_of_date) from balance_snapshots s2
+        where s2.commitment_id = s.commitment_id and s2.as_of_date <= :as_of
+    )
+    and (:commitment_id is null or s.commitment_id = :commitment_id)
+),
+tail as (
+    select
+        le.commitment_id,
+        sum(case when le.trans_code = 'CC-PRIN' then le.amount else 0 end) as contributions,
+        sum(case when le.trans_code in ('INC-ORD', 'GAIN-RL') then le.amount else 0 end) as additions,
+        sum(case when le.trans_code in ('EXP-GEN', 'LOSS-RL') then le.amount else 0 end) as deductions,
+        sum(case when le.trans_code in ('DIST-ROC', 'DIST-GAIN') then le.amount else 0 end) as distributions,
+        count(*) as entry_count
+    from ledger_entries le
+    join batches b on b.id = le.batch_id
+    left join snap on snap.commitment_id = le.commitment_id
+    where le.fund_id = :fund_id
+      and b.status = 'POSTED'
+      and b.batch_date <= :as_of
+      and (snap.as_of_date is null or b.batch_date > snap.as_of_date)
+      and (:commitment_id is null or le.commitment_id = :commitment_id)
+    group by le.commitment_id
+)
+select
+    u.commitment_id,
+    sum(u.contributions) as contributions, sum(u.additions) as additions,
+    sum(u.deductions) as deductions, sum(u.distributions) as distributions,
+    sum(u.entry_count) as entry_count
+from (
+    select commitment_id, contributions, additions, deductions, distributions, entry_count from snap
+    union all
+    select commitment_id, contributions, additions, deductions, distributions, entry_count from tail
+) u
+group by u.commitment_id
+order by u.commitment_id
+"""
+
+
+class SQLiteRepository(Repository):
+    name = "sqlite"
+
+    def __init__(self, path=':memory:'):
+        self.path = path
+        # Streamlit serves sessions from several threads; serialise access.
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self._lock = threading.RLock()
+        with self._lock, self.conn:
+            self.conn.executescript(SQLITE_SCHEMA)
+            # Same view definitions (and indexes) as the hosted database.
+            for view, script in [('pcap_totals', 'pcap_totals.sql'), ('batch_category_totals', 'balance_snapshots.sql')]:
+                has_view = self.conn.execute(
+                    "select 1 from sqlite_master where type = 'view' and name = ?", (view,)
+                ).fetchone()
+                if not has_view:
+                    with open(os.path.join(SQL_DIR, script)) as f:
+                        self.conn.executescript(f.read())
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return [dict(r) for r in self.conn.execute(sql, params).fetchall()]
+
+    def _execute(self, sql, params=()):
+        with self._lock, self.conn:
+            return self.conn.execute(sql, params)
+
+    def list_funds(self):
+        return self._query("select * from funds order by id")
+
+    def list_commitments(self, fund_id):
+        rows = self._query(
+            "select c.*, i.display_name from commitments c "
+            "left join investors i on i.id = c.investor_id where c.fund_id = ? order by c.id",
+            (fund_id,),
+        )
+        for r in rows:
+            name = r.pop('display_name')
+            r['investors'] = {'display_name': name} if name is not None else None
+        return rows
+
+    def list_investors(self):
+        return self._query("select * from investors order by id")
+
+    def list_draft_batches(self, fund_id, kind):
+        include, exclude = BATCH_KINDS[kind]
+        # SQLite LIKE is case-insensitive for ASCII, matching ilike.
+        clauses = ["fund_id = ?", "status = 'DRAFT'"]
+        clauses += ["description like ?"] * len(include)
+        clauses += ["description not like ?"] * len(exclude)
+        return self._query(f"select * from batches where {' and '.join(clauses)} order by id", [fund_id] + include + exclude)
+
+    def batch_entries(self, batch_id):
+        rows = self._query(
+            "select i.display_name as Investor, le.trans_code, le.amount from ledger_entries le "
+            "join commitments c on c.id = le.commitment_id "
+            "join investors i on i.id = c.investor_id "
+            "where le.batch_id = ? order by le.id",
+            (batch_id,),
+        )
+        for r in rows:
+            r['amount'] = float(r['amount'])
+        return rows
+
+    def pcap_totals(self, fund_id, commitment_id=None):
+        if commitment_id is not None:
+            return self._query("select * from pcap_totals where fund_id = ? and commitment_id = ?", (fund_id, commitment_id))
+        return self._query("select * from pcap_totals where fund_id = ? order by commitment_id", (fund_id,))
+
+    def iter_posted_chunks(self, fund_id=None, commitment_id=None, batch_ids=None, as_of=None, page_size=reader.PAGE_SIZE):
+        sql = (
+            "select le.id, le.commitment_id, le.trans_code, b.batch_date, le.amount, le.batch_id "
+            "from ledger_entries le join batches b on b.id = le.batch_id "
+            "where b.status = 'POSTED' and le.id > ?"
+        )
+        filters = []
+        if fund_id is not None:
+            sql += " and le.fund_id = ?"
+            filters.append(fund_id)
+        if commitment_id is not None:
+            sql += " and le.commitment_id = ?"
+            filters.append(commitment_id)
+        if batch_ids is not None:
+            sql += f" and le.batch_id in ({', '.join('?' * len(batch_ids))})"
+            filters.extend(batch_ids)
+        if as_of is not None:
+            sql += " and b.batch_date <= ?"
+            filters.append(str(as_of))
+        sql += " order by le.id limit ?"
+        last = -1
+        while True:
+            params = [last] + filters + [page_size]
+            with self._lock:
+                rows = self.conn.execute(sql, params).fetchall()
+            if not rows:
+                return
+            ids, cids, codes, dates, amounts, bids = zip(*rows)
+            yield reader.LedgerChunk(
+                ids=np.array(ids),
+                commitment_ids=np.array(cids),
+                trans_codes=np.array(codes, dtype=object),
+                dates=np.array(dates, dtype=object),
+                amount_cents=cents_array(amounts),
+                batch_ids=np.array(bids),
+            )
+            last = ids[-1]
+
+    def list_posted_batches(self, fund_id=None, start=None, end=None, posted_after=None, posted_through=None):
+        sql = "select id, fund_id, batch_date, description, posted_at from batches where status = 'POSTED'"
+        params = []
+        if fund_id is not None:
+            sql += " and fund_id = ?"
+            params.append(fund_id)
+        for clause, value in [("batch_date >= ?", start), ("batch_date <= ?", end),
+                              ("posted_at > ?", posted_after), ("posted_at <= ?", posted_through)]:
+            if value is not None:
+                sql += f" and {clause}"
+                params.append(str(value))
+        return self._query(sql + " order by id", params)
+
+    def server_time(self, lag_seconds=0):
+        # Same format the posted_at triggers write.
+        rows = self._query("select strftime('%Y-%m-%d %H:%M:%f', 'now', ?) as now", (f"-{lag_seconds} seconds",))
+        return rows[0]['now']
+
+    def find_batch(self, idempotency_key):
+        rows = self._query("select id from batches where idempotency_key = ?", (idempotency_key,))
+        return rows[0]['id'] if rows else None
+
+    def insert_batch(self, batch_data):
+        cols = list(batch_data)
+        sql = f"insert into batches ({', '.join(cols)}) values ({', '.join('?' * len(cols))})"
+        return self._execute(sql, [batch_data[c] for c in cols]).lastrowid
+
+    def upsert_entries(self, entries):
+        if not entries:
+            return
+        cols = list(entries[0])
+        sql = f"insert or ignore into ledger_entries ({', '.join(cols)}) values ({', '.join('?' * len(cols))})"
+        with self._lock, self.conn:
+            self.conn.executemany(sql, [[e[c] for c in cols] for e in entries])
+
+    def set_batch_status(self, batch_id, status):
+        self._execute("update batches set status = ? where id = ?", (status, batch_id))
+
+    def _apply_snapshots(self, batch_id, period_end, sign):
+        # Inside a write transaction only (post_batches, delete_batch).
+        params = {'batch_id': batch_id, 'period_end': period_end, 'sign': sign}
+        for sql in SQLITE_APPLY_SNAPSHOTS:
+            self.conn.execute(sql, params)
+
+    def post_batches(self, batch_ids):
+        ids = list(batch_ids)
+        # begin immediate takes the database write lock up front, the SQLite
+        # counterpart of the per-fund advisory lock.
+        with self._lock, self.conn:
+            self.conn.execute("begin immediate")
+            claimed = self.conn.execute(
+                f"update batches set status = 'POSTED' where status = 'DRAFT' and id in ({', '.join('?' * len(ids))}) "
+                f"returning id, {SQLITE_QUARTER_END}",
+                ids,
+            ).fetchall()
+            for batch_id, period_end in claimed:
+                self._apply_snapshots(batch_id, period_end, 1)
+        return [batch_id for batch_id, _ in claimed]
+
+    def delete_batch(self, batch_id):
+        with self._lock, self.conn:
+            self.conn.execute("begin immediate")
+            row = self.conn.execute(f"select status, {SQLITE_QUARTER_END} from batches where id = ?", (batch_id,)).fetchone()
+            if row is not None and row[0] == 'POSTED':
+                self._apply_snapshots(batch_id, row[1], -1)
+            self.conn.execute("delete from ledger_entries where batch_id = ?", (batch_id,))
+            self.conn.execute("delete from batches where id = ?", (batch_id,))
+
+    def get_batch(self, batch_id):
+        rows = self._query("select * from batches where id = ?", (batch_id,))
+        return rows[0] if rows else None
+
+    def balances_as_of(self, fund_id, as_of, commitment_id=None):
+        return self._query(SQLITE_BALANCES_AS_OF, {'fund_id': fund_id, 'as_of': str(as_of), 'commitment_id': commitment_id})
+
+    def replace_snapshots(self, fund_id, rows):
+        with self._lock, self.conn:
+            self.conn.execute("delete from balance_snapshots where fund_id = ?", (fund_id,))
+            if rows:
+                cols = list(rows[0])
+                self.conn.executemany(
+                    f"insert into balance_snapshots ({', '.join(cols)}) values ({', '.join('?' * len(cols))})",
+                    [[r[c] for c in cols] for r in rows],
+                )
+
+
+def connect(supabase_url=None, supabase_key=None, backend=None, sqlite_path=None, fallback=True):
+    # backend: 'supabase' or 'sqlite' (default from FUNDLITE_BACKEND, else supabase).
+    # If the hosted client can't be created, fall back to the local database,
+    # or with fallback=False raise instead.
+    backend = backend or os.environ.get('FUNDLITE_BACKEND', 'supabase')
+    sqlite_path = sqlite_path or os.environ.get('FUNDLITE_DB', 'fundlite.db')
+    if backend == 'supabase':
+        try:
+            from supabase import create_client
+            return SupabaseRepository(create_client(supabase_url, supabase_key))
+        except Exception:
+            if not fallback:
+                raise
+    return SQLiteRepository(sqlite_path)
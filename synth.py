@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+
+import snapshots
+from allocation import allocate_cents, cents_array
+
+# Synthetic fund data for benchmarks and local testing. Adds a fund to a
+# SQLiteRepository with N investors (one commitment each) and M batches whose
+# descriptions and trans_code mix match what the app itself writes. Calling
+# populate again adds another fund alongside the first.
+
+# (kind, trans_code, weight, description template)
+BATCH_MIX = [
+    ('call', 'CC-PRIN', 0.30, "Call: ${amount:,.2f}"),
+    ('pl', 'INC-ORD', 0.15, "Income (Ordinary): Q{q} Income"),
+    ('pl', 'EXP-GEN', 0.20, "Expense (General): Q{q} Fees"),
+    ('pl', 'GAIN-RL', 0.10, "Gain (Realized): Q{q} Gains"),
+    ('pl', 'LOSS-RL', 0.05, "Loss (Realized): Q{q} Losses"),
+    ('dist', 'DIST-ROC', 0.12, "Dist (Return of Capital): ${amount:,.2f}"),
+    ('dist', 'DIST-GAIN', 0.08, "Dist (Realized Gain Dist): ${amount:,.2f}"),
+]
+
+# Batch size as a fraction of total commitments, by kind.
+AMOUNT_SCALE = {'call': 0.08, 'pl': 0.01, 'dist': 0.04}
+
+
+def _next_id(repo, table):
+    return repo.conn.execute(f"select coalesce(max(id), 0) + 1 from {table}").fetchone()[0]
+
+
+def populate(repo, n_commitments, n_batches, draft_ratio=0.1, seed=0, start=pd.Timestamp('2018-01-01'), fund_name="Synthetic Fund"):
+    rng = np.random.default_rng(seed)
+
+    # Ids continue from what is already there so several funds can share a database.
+    with repo._lock:
+        first_investor = _next_id(repo, 'investors')
+        first_commitment = _next_id(repo, 'commitments')
+        first_batch = _next_id(repo, 'batches')
+    investor_ids = np.arange(first_investor, first_investor + n_commitments)
+    commitment_ids = np.arange(first_commitment, first_commitment + n_commitments)
+    # Lognormal commitment sizes rounded to $1,000: many small LPs, a few anchors.
+    committed = np.maximum(np.round(rng.lognormal(13, 1.2, n_commitments), -3), 1000)
+    weights = cents_array(committed)
+
+    mix_p = np.array([m[2] for m in BATCH_MIX])
+    kinds = rng.choice(len(BATCH_MIX), size=n_batches, p=mix_p / mix_p.sum())
+    dates = start + pd.to_timedelta(np.sort(rng.integers(0, 365 * 8, n_batches)), unit='D')
+    drafts = rng.random(n_batches) < draft_ratio
+    drafts[-1] = True  # always leave one draft to review
+
+    batches, entries = [], []
+    total_committed = committed.sum()
+    for b, (k, d, is_draft) in enumerate(zip(kinds, dates, drafts), start=first_batch):
+        kind, code, _, template = BATCH_MIX[k]
+        amount = round(total_committed * AMOUNT_SCALE[kind] * rng.uniform(0.5, 1.5), 2)
+        desc = template.format(amount=amount, q=d.quarter)
+        batches.append((b, d.date().isoformat(), desc, 'DRAFT' if is_draft else 'POSTED'))
+        shares = allocate_cents(cents_array([amount])[0], weights) / 100
+        entries.append(pd.DataFrame({
+            'batch_id': b, 'commitment_id': commitment_ids, 'trans_code': code, 'amount': shares,
+        }))
+
+    with repo._lock, repo.conn:
+        fund_id = repo.conn.execute("insert into funds (name) values (?)", (fund_name,)).lastrowid
+        repo.conn.executemany(
+            "insert into investors (id, display_name) values (?, ?)",
+            [(int(i), f"Investor {i:06d}") for i in investor_ids],
+        )
+        repo.conn.executemany(
+            "insert into commitments (id, fund_id, investor_id, committed_amount) values (?, ?, ?, ?)",
+            [(c, fund_id, i, a) for c, i, a in zip(commitment_ids.tolist(), investor_ids.tolist(), committed.tolist())],
+        )
+        repo.conn.executemany(
+            "insert into batches (id, fund_id, batch_date, description, status) values (?, ?, ?, ?, ?)",
+            [(b[0], fund_id) + b[1:] for b in batches],
+        )
+        for df in entries:
+            repo.conn.executemany(
+                "insert into ledger_entries (fund_id, batch_id, commitment_id, trans_code, amount) values (?, ?, ?, ?, ?)",
+                ((fund_id,) + row for row in df.itertuples(index=False, name=None)),
+            )
+    # Batches were inserted as POSTED directly, so seed their snapshots.
+    snapshots.rebuild(repo, fund_id)
+    return {'fund_id': fund_id, 'commitments': n_commitments, 'batches': n_batches, 'entries': n_commitments * n_batches}
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from allocation import allocate_cents
+
+
+@pytest.mark.parametrize('total', [0, 1, 2, 99, 100_000_00, 123_456_789, -5, -100_000_01])
+@pytest.mark.parametrize('weights', [[1], [1, 1, 1], [3, 3, 3, 1], [250_000_00, 100_000_00, 650_000_00], [0, 5, 0, 7]])
+def test_allocate_cents_sums_to_the_cent(total, weights):
+    shares = allocate_cents(total, weights)
+    assert shares.dtype == np.int64
+    assert int(shares.sum()) == total
+    # Largest remainder: every share is within one cent of its exact value.
+    exact = np.array(weights, dtype=float) * total / sum(weights)
+    assert np.all(np.abs(shares - exact) < 1)
+    assert all(s == 0 for s, w in zip(shares, weights) if w == 0)
+
+
+def test_allocate_cents_huge_values_stay_exact():
+    weights = [2 ** 40, 2 ** 40 + 1, 3]
+    total = 2 ** 40 + 7
+    assert int(allocate_cents(total, weights).sum()) == total
+
+
+def test_allocate_cents_is_deterministic_on_ties():
+    assert allocate_cents(2, [1, 1, 1]).tolist() == [1, 1, 0]
+
+
+def test_allocate_cents_rejects_bad_weights():
+    with pytest.raises(ValueError):
+        allocate_cents(100, [0, 0])
+    with pytest.raises(ValueError):
+        allocate_cents(100, [1, -1])
@@ -0,0 +1,17 @@
+import cli
+
+
+def test_unreachable_supabase_does_not_fall_back_to_sqlite(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv('SUPABASE_URL', raising=False)
+    monkeypatch.delenv('SUPABASE_KEY', raising=False)
+    monkeypatch.delenv('FUNDLITE_DB', raising=False)
+    assert cli.main(['--backend', 'supabase', 'post']) == 2
+    assert "could not connect to supabase" in capsys.readouterr().err
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_post_on_sqlite(tmp_path, capsys):
+    db = str(tmp_path / 'f.db')
+    assert cli.main(['--backend', 'sqlite', '--db', db, 'post']) == 0
+    assert capsys.readouterr().err == ""
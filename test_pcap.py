@@ -0,0 +1,76 @@
+import pandas as pd
+import pytest
+
+import pcap
+import snapshots
+import writer
+from allocation import build_entries, cents_array, pro_rata
+
+# pcap_totals (sql/pcap_totals.sql) against a pandas reference on the
+# SQLite repo fixture (conftest.py).
+
+
+def save(repo, fund_id, trans_code, amount, status, batch_date='2024-03-31'):
+    commitments = pro_rata(pd.DataFrame(repo.list_commitments(fund_id)), amount)
+    return writer.save_batch(
+        repo,
+        {"fund_id": fund_id, "batch_date": batch_date, "description": writer.describe_allocation(trans_code, amount, "test"), "status": "DRAFT"},
+        lambda bid: build_entries(bid, commitments['id'], trans_code, commitments['share_cents']),
+        key=writer.new_key(),
+        final_status=status,
+    )
+
+
+def reference_totals(repo, fund_id):
+    # Straight from the tables: POSTED batches only, summed per category.
+    entries = pd.read_sql(
+        "select le.commitment_id, le.trans_code, le.amount, b.status "
+        "from ledger_entries le join batches b on b.id = le.batch_id where le.fund_id = ?",
+        repo.conn, params=(fund_id,),
+    )
+    posted = entries[entries['status'] == 'POSTED'].copy()
+    posted['category'] = posted['trans_code'].map(pcap.CATEGORIES)
+    posted['cents'] = cents_array(posted['amount'])
+    sums = posted.pivot_table(index='commitment_id', columns='category', values='cents', aggfunc='sum', fill_value=0)
+    counts = posted.groupby('commitment_id').size()
+    return {
+        int(cid): {**{name: int(sums.loc[cid].get(name, 0)) for name in pcap.TOTAL_FIELDS}, 'entry_count': int(counts[cid])}
+        for cid in sums.index
+    }
+
+
+def test_pcap_totals_match_reference(repo):
+    # Every trans_code posted in fund 1, one of each as a draft too.
+    for i, code in enumerate(pcap.CATEGORIES):
+        save(repo, 1, code, 1_000.01 * (i + 1), 'POSTED')
+        save(repo, 1, code, 77_777.77, None)
+    save(repo, 2, 'CC-PRIN', 12_345.67, 'POSTED')
+    save(repo, 2, 'DIST-ROC', 999.99, None)
+
+    for fund_id in (1, 2):
+        expected = reference_totals(repo, fund_id)
+        got = pcap.fetch_all_pcap_totals(repo, fund_id)
+        assert set(got) == set(expected)
+        for cid, totals in expected.items():
+            for name in pcap.TOTAL_FIELDS:
+                assert round(got[cid][name] * 100) == totals[name], (fund_id, cid, name)
+            assert got[cid]['entry_count'] == totals['entry_count']
+        one = next(iter(expected))
+        assert pcap.fetch_pcap_totals(repo, fund_id, one) == got[one]
+
+
+def test_drafts_are_excluded(repo):
+    save(repo, 1, 'CC-PRIN', 50_000, None)
+    assert pcap.fetch_all_pcap_totals(repo, 1) == {}
+    assert pcap.fetch_pcap_totals(repo, 1, 1) is None
+
+
+def test_every_trans_code_lands_in_its_category(repo):
+    for code, category in pcap.CATEGORIES.items():
+        before = pcap.fetch_all_pcap_totals(repo, 2)
+        save(repo, 2, code, 100, 'POSTED')
+        after = pcap.fetch_all_pcap_totals(repo, 2)
+        total = sum(after[cid][category] - before.get(cid, {}).get(category, 0) for cid in after)
+        assert total == pytest.approx(100), code
+        for other in set(pcap.TOTAL_FIELDS) - {category}:
+            assert sum(row[other] for row in after.values()) == sum(row[other] for row in before.values())
@@ -0,0 +1,62 @@
+from types import SimpleNamespace
+
+import reader
+
+ROWS = [{'id': i, 'commitment_id': i // 3} for i in range(1, 2_501)]
+
+
+class FakeQuery:
+    # Enough of a PostgREST select for iter_pages, with a server-side cap
+    # below the page size the client asks for.
+    def __init__(self, rows, cap):
+        self.rows = rows
+        self.cap = cap
+        self.calls = []
+
+    def build(self):
+        self.filters = []
+        return self
+
+    def gt(self, key, value):
+        self.filters.append((key, value))
+        return self
+
+    def order(self, key):
+        self.key = key
+        return self
+
+    def limit(self, n):
+        self.n = n
+        return self
+
+    def execute(self):
+        rows = sorted(self.rows, key=lambda r: r[self.key])
+        for key, value in self.filters:
+            rows = [r for r in rows if r[key] > value]
+        self.calls.append(self.filters)
+        return SimpleNamespace(data=rows[:min(self.n, self.cap)])
+
+
+def test_iter_pages_reads_past_a_lower_server_cap():
+    q = FakeQuery(ROWS, cap=300)
+    pages = list(reader.iter_pages(q.build, page_size=1000))
+    assert all(len(p) <= 300 for p in pages)
+    ids = [r['id'] for p in pages for r in p]
+    assert ids == [r['id'] for r in ROWS]
+    assert len(q.calls) == len(pages) + 1
+
+
+def test_read_all_rpc_pages_inside_the_function():
+    calls = []
+
+    def rpc(fn, params):
+        # A function that pages itself, capped like any other response.
+        calls.append(params)
+        after, limit = params['p_after'], min(params['p_limit'], 40)
+        ids = sorted({r['commitment_id'] for r in ROWS if after is None or r['commitment_id'] > after})[:limit]
+        return SimpleNamespace(execute=lambda: SimpleNamespace(data=[{'commitment_id': i, 'fund': params['p_fund_id']} for i in ids]))
+
+    rows = reader.read_all_rpc(SimpleNamespace(rpc=rpc), 'balances_as_of', {'p_fund_id': 7}, key='commitment_id', page_size=100)
+    assert [r['commitment_id'] for r in rows] == sorted({r['commitment_id'] for r in ROWS})
+    assert all(c['p_fund_id'] == 7 and c['p_limit'] == 100 for c in calls)
+    assert [c['p_after'] for c in calls[:2]] == [None, 39]
@@ -0,0 +1,140 @@
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import pcap
+import snapshots
+import statements
+import storage
+
+AS_OF_DATES = ['2017-12-31', '2018-03-31', '2019-05-15', '2021-12-31', '2023-07-04', '2030-01-01']
+
+
+def full_scan(repo, fund_id, as_of):
+    # Reference: every POSTED entry dated on or before as_of, summed per commitment.
+    out = {}
+    for chunk in repo.iter_posted_chunks(fund_id):
+        for cid, code, d, cents in zip(chunk.commitment_ids, chunk.trans_codes, chunk.dates, chunk.amount_cents):
+            if str(d) > as_of:
+                continue
+            acc = out.setdefault(int(cid), dict.fromkeys(pcap.TOTAL_FIELDS, 0) | {'entry_count': 0})
+            acc[pcap.CATEGORIES[code]] += int(cents)
+            acc['entry_count'] += 1
+    return out
+
+
+def assert_matches(repo, fund_id):
+    for as_of in AS_OF_DATES:
+        expected = full_scan(repo, fund_id, as_of)
+        got = snapshots.balances_as_of(repo, fund_id, as_of)
+        assert set(got) == set(expected), as_of
+        for cid, totals in expected.items():
+            for name in pcap.TOTAL_FIELDS:
+                assert round(got[cid][name] * 100) == totals[name], (as_of, cid, name)
+            assert got[cid]['entry_count'] == totals['entry_count'], (as_of, cid)
+
+
+def test_populate_seeds_snapshots(synth_repo):
+    for fund_id in (1, 2):
+        assert_matches(synth_repo, fund_id)
+
+
+def test_post_and_delete_keep_snapshots_in_step(synth_repo, drafts):
+    pending = drafts(1)
+    snapshots.post_batch(synth_repo, pending[0])
+    snapshots.post_batches(synth_repo, pending[1:])
+    assert_matches(synth_repo, 1)
+
+    posted = synth_repo.list_posted_batches(1)
+    snapshots.delete_batch(synth_repo, posted[len(posted) // 2]['id'])
+    assert_matches(synth_repo, 1)
+    assert_matches(synth_repo, 2)
+
+
+def test_rebuild_matches_incremental(synth_repo, drafts):
+    snapshots.post_batches(synth_repo, drafts(1))
+    before = snapshots.balances_as_of(synth_repo, 1, '2030-01-01')
+    snapshots.rebuild(synth_repo, 1)
+    after = snapshots.balances_as_of(synth_repo, 1, '2030-01-01')
+    for cid in before:
+        assert np.allclose([before[cid][k] for k in before[cid]], [after[cid][k] for k in before[cid]])
+
+
+def test_latest_as_of_matches_pcap_totals(synth_repo, drafts):
+    snapshots.post_batches(synth_repo, drafts(2))
+    totals = pcap.fetch_all_pcap_totals(synth_repo, 2)
+    as_of = snapshots.balances_as_of(synth_repo, 2, pd.Timestamp.max.date())
+    for cid, row in totals.items():
+        for name in pcap.TOTAL_FIELDS:
+            assert as_of[cid][name] == pytest.approx(row[name], abs=0.005)
+
+
+def test_post_batches_skips_batches_posted_concurrently(synth_repo, drafts):
+    pending = drafts(1)
+    post = synth_repo.post_batches
+
+    def racing_post(ids):
+        # Another process posts the first draft just before our transaction.
+        synth_repo.post_batches = post
+        post([pending[0]])
+        return post(ids)
+
+    synth_repo.post_batches = racing_post
+    posted = snapshots.post_batches(synth_repo, pending)
+    assert sorted(posted) == sorted(pending[1:])
+    assert snapshots.post_batches(synth_repo, pending) == []
+    assert_matches(synth_repo, 1)
+
+
+def test_failed_chunk_is_rolled_back_whole(synth_repo, drafts, monkeypatch):
+    monkeypatch.setattr(storage, 'ID_CHUNK', 2)
+    pending = drafts(1)
+    assert len(pending) > 3
+    # Fails while applying pending[3]'s deltas, in the same chunk as pending[2].
+    fail = f"insert into funds (id, name) select 1, 'x' where :batch_id = {pending[3]}"
+    monkeypatch.setattr(storage, 'SQLITE_APPLY_SNAPSHOTS', storage.SQLITE_APPLY_SNAPSHOTS + [fail])
+    with pytest.raises(sqlite3.IntegrityError):
+        snapshots.post_batches(synth_repo, pending)
+    statuses = [synth_repo.get_batch(i)['status'] for i in pending]
+    assert statuses[:2] == ['POSTED', 'POSTED']
+    assert set(statuses[2:]) == {'DRAFT'}
+    assert_matches(synth_repo, 1)
+
+
+def test_delete_of_posted_batch_is_one_transaction(synth_repo, monkeypatch):
+    batch_id = synth_repo.list_posted_batches(1)[0]['id']
+    fail = f"insert into funds (id, name) select 1, 'x' where :batch_id = {batch_id}"
+    monkeypatch.setattr(storage, 'SQLITE_APPLY_SNAPSHOTS', storage.SQLITE_APPLY_SNAPSHOTS + [fail])
+    with pytest.raises(sqlite3.IntegrityError):
+        snapshots.delete_batch(synth_repo, batch_id)
+    assert synth_repo.get_batch(batch_id)['status'] == 'POSTED'
+    assert_matches(synth_repo, 1)
+    monkeypatch.undo()
+    snapshots.delete_batch(synth_repo, batch_id)
+    assert synth_repo.get_batch(batch_id) is None
+    assert_matches(synth_repo, 1)
+
+
+def test_history_as_of_matches_full_scan(synth_repo):
+    as_of = '2019-05-15'
+    expected = full_scan(synth_repo, 1, as_of)
+    history = pcap.fetch_all_posted_history(synth_repo, 1, as_of)
+    assert {cid: len(h['date']) for cid, h in history.items()} == {cid: t['entry_count'] for cid, t in expected.items()}
+    one = next(iter(expected))
+    assert pcap.fetch_posted_history(synth_repo, 1, one, as_of) == history[one]
+    assert max(max(h['date']) for h in history.values()) <= as_of
+
+
+def test_quarter_end_statements(synth_repo, tmp_path):
+    as_of = '2019-03-31'
+    commitments = synth_repo.list_commitments(1)
+    balances = snapshots.balances_as_of(synth_repo, 1, as_of)
+    statements.run_fund_statements(synth_repo, 1, commitments, "Alpha", out=str(tmp_path), workers=1, as_of=as_of)
+    assert len(list(tmp_path.glob('*.pdf'))) == len(balances) > 0
+    jobs = statements.build_statement_jobs(
+        commitments, balances, pcap.fetch_all_posted_history(synth_repo, 1, as_of), "Alpha", as_of)
+    for job in jobs:
+        assert job['as_of'] == as_of
+        assert all(d <= as_of for d in job['dates'])
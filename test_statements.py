@@ -0,0 +1,30 @@
+import io
+import os
+import zipfile
+
+import pytest
+
+import statements
+
+UNICODE_FONT = '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+
+
+def job(name, filename):
+    return {'filename': filename, 'investor_name': name, 'fund_name': "Fund I", 'balance': 1_000.0, 'unfunded': 500.0,
+            'dates': ['2024-03-31'], 'codes': ['CC-PRIN'], 'amounts': [1_000.0], 'as_of': None}
+
+
+def test_one_unrenderable_statement_does_not_abort_the_run():
+    buf = io.BytesIO()
+    failed = statements.render_statements(
+        [job("Ann Lee", "a.pdf"), job("李", "b.pdf"), job("José Núñez", "c.pdf")], buf, workers=1)
+    assert [name for name, _ in failed] == ["b.pdf"]
+    assert "FPDFUnicodeEncodingException" in failed[0][1]
+    assert sorted(zipfile.ZipFile(buf).namelist()) == ["a.pdf", "c.pdf"]
+
+
+@pytest.mark.skipif(not os.path.exists(UNICODE_FONT), reason="needs DejaVuSans.ttf")
+def test_unicode_font_renders_non_latin_names():
+    renderer = statements.StatementRenderer(font_path=UNICODE_FONT)
+    pdf = renderer.render("Ζωή Пётр", "Fund I", 1.0, 2.0, ['2024-03-31'] * 60, ['CC-PRIN'] * 60, [1.0] * 60)
+    assert pdf.startswith(b'%PDF')
@@ -0,0 +1,73 @@
+import pandas as pd
+import pytest
+
+import pcap
+import snapshots
+import writer
+from allocation import build_entries, pro_rata
+
+
+def test_save_batch_is_idempotent(repo):
+    commitments = pro_rata(pd.DataFrame(repo.list_commitments(1)), 1_000)
+    batch_data = {"fund_id": 1, "batch_date": "2024-01-15", "description": "Call: $1,000.00", "status": "DRAFT"}
+    make = lambda bid: build_entries(bid, commitments['id'], 'CC-PRIN', commitments['share_cents'])
+
+    first = writer.save_batch(repo, batch_data, make, key='call-1', chunk_size=2)
+    again = writer.save_batch(repo, batch_data, make, key='call-1', chunk_size=2)
+    assert first == again
+    assert repo.conn.execute("select count(*) from batches").fetchone()[0] == 1
+    assert repo.conn.execute("select count(*) from ledger_entries").fetchone()[0] == len(commitments)
+
+    snapshots.post_batch(repo, first)
+    writer.save_batch(repo, batch_data, make, key='call-1', final_status='POSTED')
+    totals = pcap.fetch_all_pcap_totals(repo, 1)
+    assert sum(row['contributions'] for row in totals.values()) == pytest.approx(1_000)
+    assert sum(row['entry_count'] for row in totals.values()) == len(commitments)
+
+
+def test_failed_resave_keeps_posted_batch(repo, monkeypatch):
+    monkeypatch.setattr(writer.time, 'sleep', lambda seconds: None)
+    batch_id = writer.save_batch(repo, {"fund_id": 1, "batch_date": "2024-03-31", "description": "x", "status": "DRAFT"},
+                                 lambda bid: build_entries(bid, [1, 2], 'CC-PRIN', [60, 40]), key='posted',
+                                 final_status='POSTED')
+
+    def fail(entries):
+        raise RuntimeError("network")
+
+    monkeypatch.setattr(repo, 'upsert_entries', fail)
+    writer.save_batch(repo, {"fund_id": 1, "batch_date": "2024-03-31", "description": "x", "status": "DRAFT"},
+                      lambda bid: build_entries(bid, [1], 'CC-PRIN', [100]), key='posted', final_status='POSTED')
+    assert repo.get_batch(batch_id)['status'] == 'POSTED'
+
+    # A new batch whose entries can't be written is cleaned up.
+    with pytest.raises(RuntimeError):
+        writer.save_batch(repo, {"fund_id": 1, "batch_date": "2024-03-31", "description": "y", "status": "DRAFT"},
+                          lambda bid: build_entries(bid, [1], 'CC-PRIN', [100]), key='fresh')
+    assert repo.find_batch('fresh') is None
+
+
+def test_import_keeps_rows_with_blank_description(repo, tmp_path):
+    path = tmp_path / 'ledger.csv'
+    path.write_text(
+        "batch_date,description,status,commitment_id,trans_code,amount\n"
+        "2024-01-15,,POSTED,1,CC-PRIN,100.00\n"
+        "2024-01-15,,POSTED,2,CC-PRIN,50.25\n"
+        "2024-02-15,Fees,DRAFT,1,EXP-GEN,10\n"
+    )
+    batch_ids = writer.import_ledger_csv(repo, 1, str(path))
+    assert len(batch_ids) == 2
+    assert repo.get_batch(batch_ids[0])['description'] == ''
+    totals = pcap.fetch_all_pcap_totals(repo, 1)
+    assert sum(row['contributions'] for row in totals.values()) == pytest.approx(150.25)
+    assert writer.import_ledger_csv(repo, 1, str(path)) == batch_ids
+
+
+@pytest.mark.parametrize('column', ['batch_date', 'commitment_id', 'amount'])
+def test_import_rejects_missing_values(repo, tmp_path, column):
+    row = {'batch_date': '2024-01-15', 'description': 'x', 'status': 'POSTED',
+           'commitment_id': '1', 'trans_code': 'CC-PRIN', 'amount': '100'}
+    path = tmp_path / 'ledger.csv'
+    path.write_text(','.join(row) + '\n' + ','.join(row.values()) + '\n' + ','.join({**row, column: ''}.values()) + '\n')
+    with pytest.raises(ValueError, match=f"missing {column} on line 3"):
+        writer.import_ledger_csv(repo, 1, str(path))
+    assert repo.conn.execute("select count(*) from batches").fetchone()[0] == 0
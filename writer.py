@@ -0,0 +1,196 @@
+import hashlib
+import time
+import uuid
+
+import pandas as pd
+
+import snapshots
+from allocation import build_entries, cents_array, pro_rata
+
+# Batch + ledger entry writes. Every batch carries an idempotency key and
+# every entry an entry_key derived from it (sql/idempotent_writes.sql), so a
+# retried chunk or a re-run save is an upsert no-op rather than a double post.
+
+CHUNK_SIZE = 500
+MAX_RETRIES = 4
+BACKOFF = 0.5
+
+
+def new_key():
+    return uuid.uuid4().hex
+
+
+def with_retry(fn, retries=MAX_RETRIES, backoff=BACKOFF):
+    for attempt in range(retries + 1):
+        try:
+            return fn()
+        except Exception:
+            if attempt == retries:
+                raise
+            time.sleep(backoff * 2 ** attempt)
+
+
+def _get_or_create_batch(repo, batch_data, key, inserted):
+    # Returns (batch_id, created). `inserted` is shared across retries: once
+    # this call has tried an insert, a batch found under the key is its own.
+    batch_id = repo.find_batch(key)
+    if batch_id is not None:
+        return batch_id, bool(inserted)
+    inserted.append(key)
+    try:
+        return repo.insert_batch({**batch_data, "idempotency_key": key}), True
+    except Exception:
+        # A previous attempt may have landed even though we saw an error.
+        batch_id = repo.find_batch(key)
+        if batch_id is None:
+            raise
+        return batch_id, True
+
+
+def save_batch(repo, batch_data, make_entries, key, chunk_size=CHUNK_SIZE, final_status=None):
+    # make_entries(batch_id) -> list of entry dicts. The batch is written with
+    # batch_data's status (DRAFT for the UI) and only switched to final_status
+    # once every chunk is in, so readers never see a half-written POSTED batch.
+    inserted = []
+    batch_id, created = with_retry(lambda: _get_or_create_batch(repo, batch_data, key, inserted))
+    if not created and repo.get_batch(batch_id)['status'] == 'POSTED':
+        # Re-run of a save that already completed and posted: nothing to do.
+        return batch_id
+    entries = make_entries(batch_id)
+    try:
+        for start in range(0, len(entries), chunk_size):
+            # Entries carry their batch's fund_id so ledger reads can filter on it.
+            chunk = [
+                {**e, "fund_id": batch_data['fund_id'], "entry_key": f"{key}:{start + i}"}
+                for i, e in enumerate(entries[start:start + chunk_size])
+            ]
+            with_retry(lambda: repo.upsert_entries(chunk))
+        if final_status == 'POSTED' and batch_data.get('status') != 'POSTED':
+            # Posting goes through snapshots so balance snapshots stay current.
+            with_retry(lambda: snapshots.post_batch(repo, batch_id))
+        elif final_status and final_status != batch_data.get('status'):
+            with_retry(lambda: repo.set_batch_status(batch_id, final_status))
+    except Exception:
+        # Don't leave an orphan partial batch behind, but only remove one this
+        # call created and that is still a draft. One that reached POSTED is
+        # in everyone's balances and is left for an explicit delete.
+        if created:
+            batch = with_retry(lambda: repo.get_batch(batch_id))
+            if batch is not None and batch['status'] == 'DRAFT':
+                with_retry(lambda: repo.delete_batch(batch_id))
+        raise
+    return batch_id
+
+
+# --- Historical ledger import ---
+# CSV columns: batch_date, description, status, commitment_id, trans_code, amount.
+# One batch per (batch_date, description, status); keys are derived from the
+# file contents so importing the same file twice is a no-op. description may be
+# blank; every other column is required on every row.
+
+IMPORT_COLUMNS = ['batch_date', 'description', 'status', 'commitment_id', 'trans_code', 'amount']
+
+IMPORT_STATUSES = {'DRAFT', 'POSTED'}
+
+
+def import_ledger_csv(repo, fund_id, path, chunk_size=CHUNK_SIZE, progress=None):
+    with open(path, 'rb') as f:
+        file_hash = hashlib.sha256(f.read()).hexdigest()[:16]
+    df = pd.read_csv(path, usecols=IMPORT_COLUMNS, dtype={'amount': str})
+    df['description'] = df['description'].fillna('')
+    for column in IMPORT_COLUMNS:
+        blank = df.index[df[column].isna()]
+        if len(blank):
+            # Line numbers as in the file: header is line 1.
+            lines = ', '.join(str(i + 2) for i in blank[:10])
+            raise ValueError(f"{path}: missing {column} on line {lines}")
+    unknown = set(df['status']) - IMPORT_STATUSES
+    if unknown:
+        raise ValueError(f"{path}: unknown status {', '.join(sorted(map(str, unknown)))}")
+    # ledger_entries.fund_id is copied from the batch, so a commitment from
+    # another fund would otherwise land silently in this fund's totals.
+    foreign = set(df['commitment_id']) - {c['id'] for c in repo.list_commitments(fund_id)}
+    if foreign:
+        raise ValueError(f"{path}: commitments not in fund {fund_id}: {', '.join(map(str, sorted(foreign)))}")
+    df['amount_cents'] = cents_array(df['amount'].astype(float))
+
+    groups = df.groupby(['batch_date', 'description', 'status'], sort=False)
+    total = groups.ngroups
+    batch_ids = []
+    for done, ((batch_date, description, status), g) in enumerate(groups, start=1):
+        key = f"import:{fund_id}:{file_hash}:{done}"
+        batch_data = {"fund_id": fund_id, "batch_date": str(batch_date), "description": description, "status": "DRAFT"}
+
+        def make_entries(batch_id, g=g):
+            entries = []
+            for code, gc in g.groupby('trans_code', sort=False):
+                entries.extend(build_entries(batch_id, gc['commitment_id'], code, gc['amount_cents']))
+            return entries
+
+        batch_ids.append(save_batch(repo, batch_data, make_entries, key, chunk_size, final_status=status))
+        if progress:
+            progress(done, total)
+    return batch_ids
+
+
+# --- Allocation import ---
+# One pro-rata batch per CSV row: fund, batch_date, trans_code, amount and an
+# optional memo. Descriptions follow the app's, since draft kinds are told
+# apart by description (storage.BATCH_KINDS).
+
+ALLOCATION_COLUMNS = ['fund', 'batch_date', 'trans_code', 'amount']
+
+TRANS_LABELS = {
+    'INC-ORD': "Income (Ordinary)", 'EXP-GEN': "Expense (General)",
+    'GAIN-RL': "Gain (Realized)", 'LOSS-RL': "Loss (Realized)",
+    'DIST-ROC': "Return of Capital", 'DIST-GAIN': "Realized Gain Dist",
+}
+
+
+def describe_allocation(trans_code, amount, memo=None):
+    if trans_code == 'CC-PRIN':
+        return f"Call: ${amount:,.2f}"
+    if trans_code.startswith('DIST-'):
+        return f"Dist ({TRANS_LABELS[trans_code]}): ${amount:,.2f}"
+    return f"{TRANS_LABELS[trans_code]}: {memo or ''}".rstrip()
+
+
+def allocate_csv(repo, path, fund_ids, final_status=None, chunk_size=CHUNK_SIZE, progress=None):
+    # fund_ids maps the CSV's fund column to a fund id. Keys are derived from
+    # the file contents so re-running the same file is a no-op.
+    with open(path, 'rb') as f:
+        file_hash = hashlib.sha256(f.read()).hexdigest()[:16]
+    df = pd.read_csv(path, dtype={'fund': str, 'amount': str, 'memo': str}, keep_default_na=False)
+    missing = set(ALLOCATION_COLUMNS) - set(df.columns)
+    if missing:
+        raise ValueError(f"{path}: missing columns {', '.join(sorted(missing))}")
+    unknown = set(df['trans_code']) - set(TRANS_LABELS) - {'CC-PRIN'}
+    if unknown:
+        raise ValueError(f"{path}: unknown trans_code {', '.join(sorted(unknown))}")
+    unknown = set(df['fund']) - set(fund_ids)
+    if unknown:
+        raise ValueError(f"{path}: unknown fund {', '.join(sorted(unknown))}")
+
+    commitments = {}
+    batch_ids = []
+    for n, row in enumerate(df.itertuples(index=False), start=1):
+        fund_id = fund_ids[row.fund]
+        if fund_id not in commitments:
+            commitments[fund_id] = pd.DataFrame(repo.list_commitments(fund_id))
+            if commitments[fund_id].empty:
+                raise ValueError(f"{path}: fund {row.fund} has no commitments")
+        amount = float(row.amount)
+        shares = pro_rata(commitments[fund_id], amount)
+        batch_data = {
+            "fund_id": fund_id, "batch_date": str(row.batch_date),
+            "description": describe_allocation(row.trans_code, amount, getattr(row, 'memo', None)),
+            "status": "DRAFT",
+        }
+        batch_ids.append(save_batch(
+            repo, batch_data,
+            lambda bid: build_entries(bid, shares['id'], row.trans_code, shares['share_cents']),
+            f"alloc:{fund_id}:{file_hash}:{n}", chunk_size, final_status=final_status,
+        ))
+        if progress:
+            progress(n, len(df))
+    return batch_ids